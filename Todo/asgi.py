@@ -3,6 +3,12 @@ ASGI config for Todo project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with uvicorn, one event loop per worker process reads the requests and
+writes the responses, so slow clients don't hold a thread, and the views run
+in a pool of ASGI_THREADS threads (the CPUs + 4 up to 32 by default) once a request is read:
+
+    uvicorn Todo.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
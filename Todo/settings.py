@@ -37,11 +37,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +88,28 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# seconds a page of a user's todo list stays cached,
+# it's dropped before that as soon as the user's todos change
+TODO_TREE_CACHE_TIMEOUT = 60 * 10
+
+
+# Authentication
+# https://docs.djangoproject.com/en/3.0/topics/auth/customizing/#specifying-authentication-backends
+
+AUTHENTICATION_BACKENDS = [
+    'core.backends.UserProfileBackend',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -126,3 +150,57 @@ STATIC_URL = '/static/'
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Sorts
+# 'dense' stores the todo groups, items and attachments' positions 1..n as their sorts,
+# 'gap' leaves gaps between the sorts so moving an object only writes its own row and
+# deleting one doesn't resort the others, the API shows positions in both modes
+# (counting the objects before a page that doesn't start the list in the gap mode).
+# the dense sorts are valid gap sorts, but going back to 'dense' needs the sorts renumbered
+
+SORT_MODE = 'dense'
+
+# Background tasks
+# the tasks run in a pool of threads of every worker process,
+# eager tasks run right away in the request instead
+
+BACKGROUND_TASKS_EAGER = False
+BACKGROUND_TASKS_WORKERS = 2
+
+# Attachment downloads
+# None sends the files from django, 'x-accel-redirect' (nginx) or 'x-sendfile' (apache)
+# lets the front server send them after the permissions are checked,
+# nginx should serve MEDIA_ROOT in an internal location under ATTACHMENT_ACCEL_REDIRECT_PREFIX
+
+ATTACHMENT_DOWNLOAD_OFFLOAD = os.environ.get('ATTACHMENT_DOWNLOAD_OFFLOAD') or None
+ATTACHMENT_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Request metrics
+# every response has a Server-Timing header with its view, number of queries and
+# database, serializer and total times, set REQUEST_METRICS_LOG_LEVEL to INFO
+# to log them in a line for every request.
+# they are also exported for Prometheus at /metrics, a pre-fork server's workers
+# share them through their files in METRICS_DIR which should be emptied when it starts,
+# without it every process only exports its own metrics.
+# set METRICS_TOKEN to only export them to the scrapers sending it as their bearer token
+
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
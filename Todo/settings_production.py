@@ -0,0 +1,53 @@
+"""
+Production settings for Todo project.
+
+The development settings with debugging off, the secrets and hosts taken
+from the environment and the state shared by the server's worker processes.
+Used by the gunicorn server started with gunicorn.conf.py.
+"""
+
+import os
+
+from Todo.settings import *  # noqa: F401,F403
+from Todo.settings import DATABASES, LOGGING
+
+SECRET_KEY = os.environ['SECRET_KEY']
+
+# debugging keeps every query of a request in memory and shows tracebacks to the clients
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost').split(',')
+
+# the workers keep their connection between requests instead of opening one for every request
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+# the cached pages and the users' versions must be shared by all the workers,
+# a worker with its own cache would keep serving the pages cached before another
+# worker changed the user's todos, create the table with createcachetable
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'core_cache',
+    }
+}
+
+# the browsable API's pages are only rendered for debugging
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+}
+
+SECURE_REFERRER_POLICY = 'same-origin'
+
+# set HTTPS to 1 when the server is only reached over HTTPS, through a proxy setting X-Forwarded-Proto
+if os.environ.get('HTTPS') == '1':
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+    SESSION_COOKIE_SECURE = True
+    CSRF_COOKIE_SECURE = True
+
+# collected by collectstatic and served with MEDIA_ROOT by the front server, see nginx/todoapi.conf
+STATIC_ROOT = os.path.join(BASE_DIR, 'static')  # noqa: F405
+
+# the workers export their metrics together, gunicorn empties the directory when it starts
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/todo-metrics')
+
+LOGGING['loggers']['core.metrics']['level'] = os.environ.get('REQUEST_METRICS_LOG_LEVEL', 'INFO')
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class UserProfileBackend(ModelBackend):
+    """The authentication backend that loads the user's profile
+    with the user itself, so the permission classes can check
+    the profile without querying it again on every request."""
+
+    def get_user(self, user_id):
+        """Gives the user of a session with its profile joined"""
+
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,91 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.http import quote_etag
+
+
+def user_version_key(profile_id):
+    """Gives the cache key of a user profile's version."""
+
+    return 'core:user-version:{0}'.format(profile_id)
+
+
+def new_version():
+    """Gives a version that was never used before, so a version that was evicted
+    from the cache can't come back and match entries cached before its eviction."""
+
+    return int(time.time() * 1000000)
+
+
+def get_user_version(profile_id):
+    """Gives the current version of a user profile, its todo groups, items and attachments.
+    Arguments:
+        profile_id: the id of the user profile.
+    Returns:
+        An integer that changes every time the user's profile or todos change.
+    """
+
+    key = user_version_key(profile_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def incr_user_version(profile_id):
+    """Increments the version of a user profile."""
+
+    try:
+        cache.incr(user_version_key(profile_id))
+    except ValueError:
+        cache.set(user_version_key(profile_id), new_version(), None)
+
+
+def bump_user_version(profile_id):
+    """Changes the version of a user profile,
+    so everything cached with the old version is no longer used.
+    Inside a transaction the version is changed again after the commit,
+    since pages read before the commit are cached with the new version.
+    Arguments:
+        profile_id: the id of the user profile whose profile or todos changed.
+    """
+
+    incr_user_version(profile_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: incr_user_version(profile_id))
+
+
+def todo_tree_cache_key(profile_id, url):
+    """Gives the cache key of a page of a user's todo list.
+    Arguments:
+        profile_id: the id of the user profile whose todos are listed.
+        url: the full URL of the requested page, with its query parameters.
+    Returns:
+        The cache key of the page for the user's current version.
+    """
+
+    return 'core:todo-tree:{0}:{1}:{2}'.format(profile_id, get_user_version(profile_id),
+                                                hashlib.md5(url.encode()).hexdigest())
+
+
+
+def user_etag(profile_id, request):
+    """Gives the ETag of a response on a user profile's data,
+    it changes with the user's version so it's found without
+    reading or serializing the data itself.
+    Arguments:
+        profile_id: the id of the user profile whose data is sent.
+        request: the request of the data, its path and query parameters
+                 make the ETag unique to the requested resource, and its
+                 accepted renderer to the representation (JSON or the browsable
+                 API's HTML), the responses vary on the Accept header.
+    Returns:
+        The quoted strong ETag.
+    """
+
+    key = '{0}:{1}:{2}:{3}'.format(profile_id, get_user_version(profile_id), request.get_full_path(),
+                                   request.accepted_renderer.format)
+    return quote_etag(hashlib.md5(key.encode()).hexdigest())
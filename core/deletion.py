@@ -0,0 +1,74 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+# the containers being deleted by the current thread's cascade deletion
+_state = threading.local()
+
+
+@contextmanager
+def cascade_deletion():
+    """The context of an object's deletion with its cascade,
+    the todo groups, items and user profiles deleted in it are recorded
+    so the receivers of their children can skip the work done on a container
+    that is deleted too, like resorting its other children.
+    The work the receivers defer with defer_to_end is done once for all
+    the deleted objects when the deletion ends, in its transaction.
+    It can be nested, only the outermost deletion clears the records.
+    """
+
+    if hasattr(_state, 'deleted'):
+        yield
+        return
+
+    _state.deleted = set()
+    _state.deferred = {}
+    try:
+        with transaction.atomic(savepoint=False):
+            yield
+            for func, values in _state.deferred.items():
+                func(values)
+    finally:
+        del _state.deleted
+        del _state.deferred
+
+
+def defer_to_end(func, value):
+    """Collects a value for a function called once with all the collected values
+    when the current cascade deletion ends, so the receivers of the deleted
+    objects do their work in a few queries instead of a few for every object.
+    Arguments:
+        func: the function, it's given the list of the values.
+        value: the value added to the function's list.
+    Returns:
+        True if the value is collected, False outside of a cascade deletion,
+        then the caller should do the work itself.
+    """
+
+    deferred = getattr(_state, 'deferred', None)
+    if deferred is None:
+        return False
+    deferred.setdefault(func, []).append(value)
+    return True
+
+
+def mark_deleted(instance):
+    """Records that an object is deleted in the current cascade deletion,
+    nothing is recorded outside of a cascade deletion"""
+
+    deleted = getattr(_state, 'deleted', None)
+    if deleted is not None:
+        deleted.add((type(instance), instance.pk))
+
+
+def is_deleted(model, pk):
+    """Checks if an object is deleted in the current cascade deletion.
+    Arguments:
+        model: the model of the object.
+        pk: the primary key of the object.
+    Returns:
+        True if the object is deleted with the current cascade, False if not.
+    """
+
+    return (model, pk) in getattr(_state, 'deleted', ())
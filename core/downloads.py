@@ -0,0 +1,153 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# the size of the chunks read from a file when it's streamed through python
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when the requested range starts after the end of the file"""
+
+
+class FileRange:
+    """A file-like object reading only a range of a file,
+    so it can be streamed by a FileResponse."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        """Reads at most size bytes without going past the range's end"""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Gives the bytes range asked for by a Range header.
+    Only single ranges are served, the header is ignored
+    for anything else as HTTP allows it.
+    Arguments:
+        header: the value of the Range header.
+        size: the size of the requested file.
+    Returns:
+        The (start, end) bytes of the range, the end included,
+        or None if the whole file should be sent.
+    Raises:
+        RangeNotSatisfiable: if the range is outside of the file.
+    """
+
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        # a suffix range, the last bytes of the file
+        if int(end) == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(end), 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if end < start and start < size:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def attachment_etag(attachment, stat):
+    """Gives the ETag of an attachment's file, its content hash when it's stored
+    in a blob or its modification time and size if it's not"""
+
+    if attachment.blob_id is not None:
+        return quote_etag(attachment.blob.sha256)
+    return quote_etag('{0:x}-{1:x}'.format(int(stat.st_mtime), stat.st_size))
+
+
+def attachment_response(request, attachment):
+    """Gives the response sending an attachment's file.
+    The conditional requests get a 304 or 412 response, then the file is either
+    offloaded to the front server with X-Accel-Redirect or X-Sendfile headers as
+    set in the ATTACHMENT_DOWNLOAD_OFFLOAD setting, or sent by a FileResponse
+    which the WSGI server can send with sendfile, or only a range of it is
+    streamed if the request has a Range header.
+    Arguments:
+        request: the download request.
+        attachment: the attachment whose file is downloaded.
+    Returns:
+        The HTTP response of the download.
+    """
+
+    path = attachment.file.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('No such file.')
+
+    etag = attachment_etag(attachment, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        offload = settings.ATTACHMENT_DOWNLOAD_OFFLOAD
+        if offload == 'x-accel-redirect':
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = quote(settings.ATTACHMENT_ACCEL_REDIRECT_PREFIX + attachment.file.name)
+        elif offload == 'x-sendfile':
+            response = HttpResponse()
+            response['X-Sendfile'] = path
+        else:
+            response = file_response(request, path, stat.st_size, etag, last_modified)
+
+        content_type, encoding = mimetypes.guess_type(path)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        response['Content-Disposition'] = 'attachment; filename="{0}"'.format(os.path.basename(path))
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private'
+    return response
+
+
+def file_response(request, path, size, etag, last_modified):
+    """Gives the FileResponse of a file or of the range
+    of it asked for by the request's Range header"""
+
+    file_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if 'HTTP_RANGE' in request.META and if_range in (None, etag, http_date(last_modified)):
+        try:
+            file_range = parse_range(request.META['HTTP_RANGE'], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{0}'.format(size)
+            return response
+
+    if file_range is None:
+        response = FileResponse(open(path, 'rb'))
+    else:
+        start, end = file_range
+        response = FileResponse(FileRange(open(path, 'rb'), start, end - start + 1), status=206)
+        response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, end, size)
+        response['Content-Length'] = end - start + 1
+
+    response.block_size = DOWNLOAD_BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,104 @@
+import io
+import logging
+import os
+import threading
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# the longest side in pixels of every size of the profile photos' derivatives
+PHOTO_DERIVATIVE_SIZES = {
+    'small': 64,
+    'medium': 256,
+}
+
+# the file extension and Pillow format of every format of the derivatives
+PHOTO_DERIVATIVE_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+# a background task and a request making the same derivatives
+# would otherwise both save them under different names
+_generation_lock = threading.Lock()
+
+
+def derivative_name(photo_name, size, extension):
+    """Gives the path of a profile photo's derivative,
+    it's made from the photo's unique name so it can be found
+    without storing it.
+    Arguments:
+        photo_name: the path of the profile photo in the storage.
+        size: the derivative's size name.
+        extension: the derivative's format extension.
+    Returns:
+        The path of the derivative in the storage.
+    """
+
+    photo_id = os.path.basename(photo_name).split('.')[0]
+    return 'users/derivatives/{0}_{1}.{2}'.format(photo_id, size, extension)
+
+
+def photo_derivative_names(photo_name):
+    """Gives the paths of all the derivatives of a profile photo by size and format"""
+
+    return {size: {extension: derivative_name(photo_name, size, extension)
+                   for extension in PHOTO_DERIVATIVE_FORMATS}
+            for size in PHOTO_DERIVATIVE_SIZES}
+
+
+def existing_photo_derivatives(photo_name, storage=default_storage):
+    """Gives the paths of the derivatives of a profile photo that were already made,
+    by size and format, the sizes without any of them are left out"""
+
+    existing = {size: {extension: name for extension, name in formats.items() if storage.exists(name)}
+                for size, formats in photo_derivative_names(photo_name).items()}
+    return {size: formats for size, formats in existing.items() if formats}
+
+
+def generate_photo_derivatives(photo_name, storage=default_storage):
+    """Makes the missing resized WebP and JPEG copies of a profile photo.
+    The photo is decoded once and downscaled from the biggest size to the smallest.
+    A photo that can't be read or a format that can't be written (like WebP
+    with a Pillow built without libwebp) is logged instead of failing the task,
+    the other formats are still made.
+    Arguments:
+        photo_name: the path of the profile photo in the storage.
+        storage: the storage of the profile photos.
+    Returns:
+        True if any copy was written, False if there was nothing to make or nothing could be made.
+    """
+
+    names = photo_derivative_names(photo_name)
+    written = False
+    with _generation_lock:
+        missing = {size: {extension: name for extension, name in formats.items() if not storage.exists(name)}
+                   for size, formats in names.items()}
+        if not any(missing.values()):
+            return False
+
+        try:
+            with storage.open(photo_name) as photo:
+                image = ImageOps.exif_transpose(Image.open(photo))
+                image = image.convert('RGB')
+        except (OSError, ValueError):
+            logger.exception('Could not read the profile photo %s', photo_name)
+            return False
+
+        for size in sorted(PHOTO_DERIVATIVE_SIZES, key=PHOTO_DERIVATIVE_SIZES.get, reverse=True):
+            pixels = PHOTO_DERIVATIVE_SIZES[size]
+            image.thumbnail((pixels, pixels), Image.LANCZOS)
+            for extension, name in missing[size].items():
+                content = io.BytesIO()
+                try:
+                    image.save(content, PHOTO_DERIVATIVE_FORMATS[extension], quality=85)
+                except (KeyError, OSError, ValueError):
+                    logger.exception('Could not make the %s %s copy of the profile photo %s',
+                                     size, extension, photo_name)
+                    continue
+                storage.save(name, ContentFile(content.getvalue()))
+                written = True
+    return written
@@ -0,0 +1,249 @@
+import json
+import math
+import platform
+import shutil
+import tempfile
+import time
+from contextlib import nullcontext
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from core.seeding import seed_users
+
+BENCHMARK_PASSWORD = 'correct-horse-battery-staple'
+
+# the file all the seeded attachments point to, it's written in a temporary media root
+BENCHMARK_FILE = 'attachments/benchmark'
+BENCHMARK_FILE_SIZE = 256 * 1024
+
+
+def percentile(timings, percent):
+    """Gives the nearest-rank percentile of sorted timings"""
+
+    return timings[max(int(math.ceil(percent / 100 * len(timings))) - 1, 0)]
+
+
+def json_body(data):
+    """Gives the client arguments sending data in JSON"""
+
+    return lambda: {'data': data, 'content_type': 'application/json'}
+
+
+class Command(BaseCommand):
+    """Sends requests to every route of the API through the test client on a seeded
+    database and reports their latencies, throughput and number of queries in JSON.
+    Every request runs in a savepoint that is rolled back, so all of them see the
+    same seeded data, and the seeded data is rolled back at the end."""
+
+    help = "Benchmarks every route of the API on a seeded database and prints the results in JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='users to seed')
+        parser.add_argument('--groups', type=int, default=20, help='todo groups to seed for each user')
+        parser.add_argument('--todos', type=int, default=20, help='todo items to seed for each group')
+        parser.add_argument('--attachments', type=int, default=2, help='attachments to seed for each todo item')
+        parser.add_argument('--iterations', type=int, default=50, help='timed requests sent to each route')
+        parser.add_argument('--warmup', type=int, default=5, help='untimed requests sent to each route first')
+        parser.add_argument('--route', action='append', default=[],
+                            help='only benchmark the routes whose names contain this, it can be repeated')
+        parser.add_argument('--cold-cache', action='store_true',
+                            help='clear the cache before every request so no page is served from it')
+        parser.add_argument('--output', help='write the results to this file instead of the standard output')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['groups'] < 1 or options['todos'] < 1 or options['attachments'] < 1:
+            raise CommandError('at least one user, todo group, todo item and attachment must be seeded')
+        if options['iterations'] < 1:
+            raise CommandError('each route needs at least one timed request')
+
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+                username = self.seed(options)
+                routes = [route for route in self.routes(username, options)
+                          if not options['route'] or any(name in route[0] for name in options['route'])]
+                results = [self.benchmark(*route, options=options) for route in routes]
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = {
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'sort_mode': settings.SORT_MODE,
+            'seed': {name: options[name] for name in ('users', 'groups', 'todos', 'attachments')},
+            'iterations': options['iterations'],
+            'cold_cache': options['cold_cache'],
+            'routes': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def seed(self, options):
+        """Seeds users with todo groups, items and attachments and writes the attachments' file.
+        Returns:
+            The username of the user whose todos are requested, it can log in with BENCHMARK_PASSWORD.
+        """
+
+        default_storage.save(BENCHMARK_FILE, ContentFile(b'\0' * BENCHMARK_FILE_SIZE))
+        profiles = seed_users('benchmark-user', options['users'], options['groups'], options['todos'],
+                              options['attachments'], BENCHMARK_FILE)
+        account = profiles[0].account
+        account.set_password(BENCHMARK_PASSWORD)
+        account.save()
+        self.account = account
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(account)
+        return account.username
+
+    def anonymous_client(self):
+        """Gives a client that isn't logged in"""
+
+        return Client(raise_request_exception=False)
+
+    def user_client(self):
+        """Gives the client logged in as the benchmarked user"""
+
+        return self.client
+
+    def new_user_client(self):
+        """Gives a new client logged in as the benchmarked user, for the requests
+        that end or rotate the client's session which is then rolled back"""
+
+        client = Client(raise_request_exception=False)
+        client.force_login(self.account)
+        return client
+
+    def routes(self, username, options):
+        """Gives the requests sent to every route of the API.
+        Returns:
+            A list of (name, method, path, body, client) tuples,
+            body gives the client's arguments of a request and client gives its client.
+        """
+
+        user = {'username': username}
+        group = {'username': username, 'pk': 1}
+        todos = {'username': username, 'group_sort': 1}
+        todo = {'username': username, 'group_sort': 1, 'pk': 1}
+        attachments = {'username': username, 'group_sort': 1, 'item_sort': 1}
+        attachment = {'username': username, 'group_sort': 1, 'item_sort': 1, 'pk': 1}
+        account = {'username': username, 'first_name': 'first', 'last_name': 'last', 'password': BENCHMARK_PASSWORD}
+
+        def upload():
+            return {'data': {'file': SimpleUploadedFile('benchmark.txt', b'benchmark' * 1024)}}
+
+        return [
+            ('login', 'post', reverse('core:login'),
+             json_body({'username': username, 'password': BENCHMARK_PASSWORD}), self.anonymous_client),
+            ('logout', 'post', reverse('core:logout'), None, self.new_user_client),
+            ('signup', 'post', reverse('core:signup'),
+             json_body({'account': dict(account, username='benchmark-signup')}), self.anonymous_client),
+            ('user-details retrieve', 'get', reverse('core:user-details', kwargs=user), None, self.user_client),
+            ('user-details update', 'put', reverse('core:user-details', kwargs=user),
+             json_body({'account': dict(account, username='benchmark-renamed')}), self.new_user_client),
+            ('user-details partial_update', 'patch', reverse('core:user-details', kwargs=user),
+             json_body({'account': {'first_name': 'patched'}}), self.new_user_client),
+            ('user-details destroy', 'delete', reverse('core:user-details', kwargs=user), None, self.user_client),
+            ('todo-list', 'get', reverse('core:todo-list', kwargs=user), None, self.user_client),
+            ('todo-list cursor', 'get', reverse('core:todo-list', kwargs=user) + '?pagination=cursor',
+             None, self.user_client),
+            ('todo-list summary', 'get', reverse('core:todo-list', kwargs=user) + '?summary=true',
+             None, self.user_client),
+            ('todo-search', 'get', reverse('core:todo-search', kwargs=user) + '?q=todo', None, self.user_client),
+            ('batch', 'post', reverse('core:batch', kwargs=user), json_body({'operations': [
+                {'resource': 'todo-group', 'action': 'create', 'data': {'title': 'batch'}},
+                {'resource': 'todo-item', 'action': 'create', 'group_sort': 1, 'data': {'title': 'batch'}},
+                {'resource': 'todo-item', 'action': 'partial_update', 'group_sort': 1, 'sort': 1,
+                 'data': {'status': 'C'}},
+            ]}), self.user_client),
+            ('todo_groups-list create', 'post', reverse('core:todo_groups-list', kwargs=user),
+             json_body({'title': 'benchmark'}), self.user_client),
+            ('todo_groups-detail update', 'put', reverse('core:todo_groups-detail', kwargs=group),
+             json_body({'sort': options['groups'], 'title': 'moved'}), self.user_client),
+            ('todo_groups-detail destroy', 'delete', reverse('core:todo_groups-detail', kwargs=group),
+             None, self.user_client),
+            ('todo-create group_list', 'get', reverse('core:todo-create', kwargs=todos), None, self.user_client),
+            ('todo-create create', 'post', reverse('core:todo-create', kwargs=todos),
+             json_body({'title': 'benchmark'}), self.user_client),
+            ('todo-create bulk create', 'post', reverse('core:todo-create', kwargs=todos),
+             json_body([{'title': 'benchmark'}] * 10), self.user_client),
+            ('todo-detail retrieve', 'get', reverse('core:todo-detail', kwargs=todo), None, self.user_client),
+            ('todo-detail update', 'put', reverse('core:todo-detail', kwargs=todo),
+             json_body({'sort': options['todos'], 'title': 'moved', 'status': 'C'}), self.user_client),
+            ('todo-detail partial_update', 'patch', reverse('core:todo-detail', kwargs=todo),
+             json_body({'status': 'C'}), self.user_client),
+            ('todo-detail destroy', 'delete', reverse('core:todo-detail', kwargs=todo), None, self.user_client),
+            ('todo_attachments-list create', 'post', reverse('core:todo_attachments-list', kwargs=attachments),
+             upload, self.user_client),
+            ('todo_attachments-download', 'get', reverse('core:todo_attachments-download', kwargs=attachment),
+             None, self.user_client),
+            ('todo_attachments-detail destroy', 'delete',
+             reverse('core:todo_attachments-detail', kwargs=attachment), None, self.user_client),
+            ('metrics', 'get', reverse('core:metrics'), None, self.anonymous_client),
+        ]
+
+    def benchmark(self, name, method, path, body, client, options):
+        """Sends the warmup requests, one request counting its queries
+        and the timed requests of a route.
+        Returns:
+            The route's results.
+        """
+
+        for i in range(options['warmup']):
+            self.send(method, path, body, client(), options)
+        response, elapsed, queries = self.send(method, path, body, client(), options, count_queries=True)
+        timings = sorted(self.send(method, path, body, client(), options)[1]
+                         for i in range(options['iterations']))
+
+        return {
+            'route': name,
+            'url_name': resolve(path.split('?')[0]).url_name,
+            'method': method.upper(),
+            'path': path,
+            'status': response.status_code,
+            'queries': queries,
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'requests_per_second': round(len(timings) / sum(timings), 1),
+        }
+
+    def send(self, method, path, body, client, options, count_queries=False):
+        """Sends a request in a savepoint that is rolled back afterwards.
+        Returns:
+            The response, the seconds it took including reading a streamed
+            content and the number of queries if they are counted.
+        """
+
+        if options['cold_cache']:
+            cache.clear()
+        kwargs = body() if body else {}
+
+        # the queries are only recorded while they're counted
+        capture = CaptureQueriesContext(connection) if count_queries else nullcontext()
+        with transaction.atomic():
+            with capture:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                # the client closes the streamed responses once they are read
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        return response, elapsed, len(capture.captured_queries) if count_queries else None
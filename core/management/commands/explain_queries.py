@@ -0,0 +1,101 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from core.models import UserProfileModel, TodoModel, TodoAttachmentModel
+from core.search import search_todos
+from core.seeding import seed_users
+from core.sorting import at_position
+from core.views import user_todo_group, user_todo_item
+
+# the lines of the query plans that read a whole table
+SEQUENTIAL_SCANS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)'),
+}
+
+
+class Command(BaseCommand):
+    """Runs EXPLAIN on the canonical query of every view and flags
+    the ones that read a whole table instead of using an index"""
+
+    help = "Explains the views' queries on a seeded database and flags sequential scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='users to seed')
+        parser.add_argument('--groups', type=int, default=20, help='todo groups to seed for each user')
+        parser.add_argument('--todos', type=int, default=20, help='todo items to seed for each group')
+        parser.add_argument('--attachments', type=int, default=2, help='attachments to seed for each todo item')
+        parser.add_argument('--allow-seqscan', action='store_true',
+                            help="let the planner choose sequential scans on small tables, "
+                                 "by default they're only used when no index can answer the query")
+        parser.add_argument('--verbose-plans', action='store_true', help='print every plan, not just the flagged ones')
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCANS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError("can't read the query plans of {0} databases".format(connection.vendor))
+
+        # the seeded data is rolled back once the queries are explained
+        with transaction.atomic():
+            username = self.seed(options)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                    if not options['allow_seqscan']:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+
+            flagged = []
+            for name, queryset in self.view_queries(username):
+                plan = queryset.explain()
+                tables = pattern.findall(plan)
+                if tables:
+                    flagged.append(name)
+                    self.stdout.write(self.style.ERROR('{0}: sequential scan on {1}'.format(name, ', '.join(tables))))
+                else:
+                    self.stdout.write(self.style.SUCCESS('{0}: OK'.format(name)))
+                if tables or options['verbose_plans']:
+                    self.stdout.write(plan)
+
+            transaction.set_rollback(True)
+
+        if flagged:
+            raise CommandError('{0} queries read a whole table: {1}'.format(len(flagged), ', '.join(flagged)))
+
+    def seed(self, options):
+        """Seeds users with todo groups, items and attachments.
+        Returns:
+            The username of one of the seeded users.
+        """
+
+        profiles = seed_users('explain-user', options['users'], options['groups'], options['todos'],
+                              options['attachments'], 'attachments/explain')
+        return profiles[0].account.username
+
+    def view_queries(self, username):
+        """Gives the canonical queries of the views for a user.
+        Returns:
+            A list of (name, queryset) pairs.
+        """
+
+        profile = UserProfileModel.objects.get(account__username=username)
+        group_ids = list(profile.todo_groups.values_list('pk', flat=True)[:10])
+        todo_ids = list(TodoModel.objects.filter(category_id__in=group_ids).values_list('pk', flat=True))
+
+        return [
+            ('UserProfileView', UserProfileModel.objects.filter(account__username=username)),
+            ('TodoGroupView', user_todo_group(username, 1)),
+            ('TodoView.list groups', profile.todo_groups.all()[:10]),
+            ('TodoView.list todos', TodoModel.objects.filter(category_id__in=group_ids)),
+            ('TodoView.list attachments', TodoAttachmentModel.objects.filter(todo_item_id__in=todo_ids)),
+            ('TodoView', user_todo_item(username, 1, 1)),
+            ('TodoView.list summary', profile.todo_groups.annotate(todos_count=Count('todos'))[:10]),
+            ('TodoView.group_list', TodoModel.objects.filter(category_id=group_ids[0])[:20]),
+            ('TodoView.create', user_todo_group(username, 1)),
+            ('TodoView.search', search_todos(profile.pk, 'todo')),
+            ('TodoView sort', TodoModel.objects.filter(category_id=group_ids[0]).order_by('-sort')[:1]),
+            ('TodoAttachmentView', at_position(TodoAttachmentModel.objects.filter(
+                todo_item__in=user_todo_item(username, 1, 1)), 1)),
+        ]
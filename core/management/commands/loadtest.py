@@ -0,0 +1,170 @@
+import asyncio
+import json
+import random
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.management.commands.benchmark import percentile
+from core.seeding import seed_users
+
+LOADTEST_PASSWORD = 'correct-horse-battery-staple'
+LOADTEST_FILE = 'attachments/loadtest'
+
+
+class Command(BaseCommand):
+    """Sends concurrent requests to the read endpoints of a running server and reports
+    their latencies and throughput in JSON, so the WSGI and ASGI deployments can be compared.
+    Every request opens its own connection, like many different clients, and the slow
+    clients wait a random time between the two halves of their request, so a server
+    reading the requests in its worker threads keeps a thread waiting for a client
+    while the requests of others are ready.
+    The users are seeded in the server's database before the requests and deleted afterwards."""
+
+    help = "Load tests the read endpoints of a running server with concurrent, optionally slow, clients."
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='the base url of the server, like http://127.0.0.1:8000')
+        parser.add_argument('--label', default='', help='the name of the tested deployment in the results')
+        parser.add_argument('--concurrency', type=int, default=50, help='clients sending requests at the same time')
+        parser.add_argument('--requests', type=int, default=500, help='requests sent to each endpoint')
+        parser.add_argument('--slow-client-delay', type=float, default=0,
+                            help='the average seconds a client waits in the middle of sending its request')
+        parser.add_argument('--timeout', type=float, default=30, help='seconds before a request is failed')
+        parser.add_argument('--groups', type=int, default=10, help='todo groups to seed')
+        parser.add_argument('--todos', type=int, default=10, help='todo items to seed for each group')
+        parser.add_argument('--output', help='write the results to this file instead of the standard output')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('the url must be an http url like http://127.0.0.1:8000')
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('at least one client must send at least one request')
+
+        username = self.seed(options)
+        try:
+            session = self.login(options['url'], username)
+            routes = [
+                ('UserProfileView.retrieve', reverse('core:user-details', kwargs={'username': username})),
+                ('TodoView.list', reverse('core:todo-list', kwargs={'username': username})),
+                ('TodoView.group_list', reverse('core:todo-create', kwargs={'username': username, 'group_sort': 1})),
+                ('TodoView.retrieve', reverse('core:todo-detail', kwargs={'username': username,
+                                                                          'group_sort': 1, 'pk': 1})),
+            ]
+            results = [asyncio.run(self.load(url, name, path, session, options)) for name, path in routes]
+        finally:
+            User.objects.filter(username__startswith='loadtest-user-').delete()
+            default_storage.delete(LOADTEST_FILE)
+
+        report = {
+            'label': options['label'],
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'slow_client_delay': options['slow_client_delay'],
+            'routes': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def seed(self, options):
+        """Seeds a user with todo groups and items in the database.
+        Returns:
+            The username of the seeded user, it can log in with LOADTEST_PASSWORD.
+        """
+
+        User.objects.filter(username__startswith='loadtest-user-').delete()
+        file_name = default_storage.save(LOADTEST_FILE, ContentFile(b'loadtest'))
+        account = seed_users('loadtest-user', 1, options['groups'], options['todos'], 1, file_name)[0].account
+        account.set_password(LOADTEST_PASSWORD)
+        account.save()
+        return account.username
+
+    def login(self, base_url, username):
+        """Logs the seeded user in on the server.
+        Returns:
+            The session cookie of the user.
+        """
+
+        request = Request(base_url.rstrip('/') + reverse('core:login'), method='POST',
+                          data=json.dumps({'username': username, 'password': LOADTEST_PASSWORD}).encode(),
+                          headers={'Content-Type': 'application/json'})
+        with urlopen(request) as response:
+            cookie = SimpleCookie()
+            for header in response.headers.get_all('Set-Cookie'):
+                cookie.load(header)
+        return '; '.join('{0}={1}'.format(name, morsel.value) for name, morsel in cookie.items())
+
+    async def load(self, url, name, path, session, options):
+        """Sends the requests of an endpoint from the concurrent clients.
+        Returns:
+            The endpoint's results.
+        """
+
+        remaining = [options['requests']]
+        timings = []
+        errors = []
+
+        async def client():
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                try:
+                    status, elapsed = await asyncio.wait_for(
+                        self.send(url, path, session, options['slow_client_delay']), options['timeout'])
+                except (OSError, asyncio.TimeoutError) as e:
+                    errors.append(type(e).__name__)
+                    continue
+                if status == 200:
+                    timings.append(elapsed)
+                else:
+                    errors.append(str(status))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for i in range(options['concurrency'])))
+        duration = time.perf_counter() - start
+
+        timings.sort()
+        return {
+            'route': name,
+            'path': path,
+            'requests': options['requests'],
+            'errors': {error: errors.count(error) for error in sorted(set(errors))},
+            'p50_ms': round(percentile(timings, 50) * 1000, 3) if timings else None,
+            'p99_ms': round(percentile(timings, 99) * 1000, 3) if timings else None,
+            'requests_per_second': round(len(timings) / duration, 1),
+        }
+
+    async def send(self, url, path, session, slow_client_delay):
+        """Sends a GET request on its own connection and reads all of the response.
+        Returns:
+            The response's status code, or "no response" if the server closed
+            the connection without answering, and the seconds it took.
+        """
+
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+        try:
+            head = 'GET {0} HTTP/1.1\r\nHost: {1}\r\nCookie: {2}\r\n'.format(path, url.netloc, session).encode()
+            writer.write(head)
+            if slow_client_delay:
+                await writer.drain()
+                await asyncio.sleep(random.uniform(0, 2 * slow_client_delay))
+            writer.write(b'Connection: close\r\n\r\n')
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+        finally:
+            writer.close()
+        parts = status_line.split()
+        return int(parts[1]) if len(parts) > 1 else 'no response', time.perf_counter() - start
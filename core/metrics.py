@@ -0,0 +1,112 @@
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# the metrics of the request handled by the current thread
+_state = threading.local()
+
+
+class RequestMetrics:
+    """The number of queries and the timings of a request,
+    the times are in seconds and the serializer time includes
+    the queries run while the data is serialized."""
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.total_time = 0.0
+        self.serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        """The database execute wrapper counting and timing the queries"""
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def server_timing(self):
+        """Gives the value of the request's Server-Timing header,
+        the number of queries and the view name are given as descriptions"""
+
+        return ', '.join((
+            'view;desc="{0}"'.format(self.view or '-'),
+            'queries;desc="{0}"'.format(self.queries),
+            'db;dur={0:.3f}'.format(self.db_time * 1000),
+            'serializer;dur={0:.3f}'.format(self.serializer_time * 1000),
+            'total;dur={0:.3f}'.format(self.total_time * 1000),
+        ))
+
+    def as_dict(self):
+        """Gives the metrics with the times in milliseconds"""
+
+        return {
+            'view': self.view,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'serializer_ms': round(self.serializer_time * 1000, 3),
+            'total_ms': round(self.total_time * 1000, 3),
+        }
+
+
+def current_metrics():
+    """Gives the metrics of the request handled by the current thread, or None outside of a request"""
+
+    return getattr(_state, 'metrics', None)
+
+
+@contextmanager
+def record_request():
+    """The context of a request whose metrics are recorded,
+    the queries of every database connection of the thread are counted in it.
+    Yields:
+        The request's RequestMetrics, its total time is set on exit.
+    """
+
+    metrics = RequestMetrics()
+    _state.metrics = metrics
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics.record_query))
+            yield metrics
+    finally:
+        metrics.total_time = time.perf_counter() - start
+        del _state.metrics
+
+
+@contextmanager
+def serializer_timer():
+    """Adds the time spent in the block to the current request's serializer time,
+    the nested serializers are only counted once by the outermost one"""
+
+    metrics = current_metrics()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+
+    metrics.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+        metrics.serializing = False
+
+
+def view_name(view_func, method):
+    """Gives the name of a view, with the action of the request's method for the viewsets
+    like TodoView.list, or the function's name for the function views like user_login"""
+
+    name = getattr(view_func, '__name__', type(view_func).__name__)
+    action = getattr(view_func, 'actions', {}).get(method.lower())
+    if action:
+        name = '{0}.{1}'.format(name, action)
+    return name
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_auto_20190911_1352'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='todoattachmentmodel',
+            name='todo_item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='core.TodoModel'),
+        ),
+        migrations.AlterField(
+            model_name='todogroupmodel',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='todo_groups', to='core.UserProfileModel'),
+        ),
+        migrations.AlterField(
+            model_name='todomodel',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='todos', to='core.TodoGroupModel'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+SEARCH_INDEX = (
+    "CREATE INDEX core_todomodel_search ON core_todomodel USING GIN "
+    "(to_tsvector('english'::regconfig, COALESCE(title, '') || ' ' || COALESCE(description, '')))"
+)
+
+TRIGRAM_INDEX = "CREATE INDEX core_todomodel_title_trigram ON core_todomodel USING GIN (title gin_trgm_ops)"
+
+
+def create_search_indexes(apps, schema_editor):
+    """Creates the full-text search index of the todos, and their titles'
+    trigram index if the pg_trgm extension can be installed"""
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(SEARCH_INDEX)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(TRIGRAM_INDEX)
+
+
+def drop_search_indexes(apps, schema_editor):
+    """Drops the search indexes of the todos"""
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_todomodel_search')
+    schema_editor.execute('DROP INDEX IF EXISTS core_todomodel_title_trigram')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
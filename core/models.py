@@ -1,9 +1,14 @@
+import hashlib
 import os
 import uuid
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+
+from core.deletion import cascade_deletion
+from core.sorting import gap_sorts, lock_container
 
 
 def users_upload(instance, filename):
@@ -34,6 +39,34 @@ def attachment_upload(instance, filename):
     return 'attachments/{0}.{1}'.format(uuid.uuid4().hex, os.path.splitext(filename))
 
 
+def blob_upload(instance, filename):
+    """Gives the path of a saved attachment blob in models,
+    it's named after the hash of its content so every
+    content is stored only once.
+    Arguments:
+        instance: the attachment blob, its hash is used as the file's name.
+        filename: the name of the file sent by user, it's
+                  used here to get the format of the file.
+    Returns:
+        The path that the blob will be stored in the DB.
+    """
+
+    return 'attachments/{0}{1}'.format(instance.sha256, os.path.splitext(filename)[1])
+
+
+def file_sha256(file):
+    """Gives the sha256 hex digest of a file's content,
+    the files streamed by the AttachmentUploadHandler are already hashed."""
+
+    digest = getattr(file, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+    return digest
+
+
 class UserProfileModel(models.Model):
     """The Model of the User Profile."""
 
@@ -43,12 +76,75 @@ class UserProfileModel(models.Model):
     def __str__(self):
         return self.account.username
 
+    def delete(self, *args, **kwargs):
+        """Deletes the user profile with all its todos without resorting them one by one"""
+        with cascade_deletion():
+            return super().delete(*args, **kwargs)
+
+
+class SortedModel(models.Model):
+    """The base Model of the objects sorted in a container,
+    their sort is given by the pre_save signals."""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        """Saves new objects in a transaction so the container stays
+        locked from giving them a sort until they are inserted"""
+        if self.pk is None:
+            with transaction.atomic():
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+    # the name of the foreign key to the object's container
+    container_field = None
+
+    def delete(self, *args, **kwargs):
+        """Deletes the object with its children without resorting them one by one,
+        the container is locked before the object's row so a move waiting
+        for the lock can't hold the row the deletion waits for"""
+        with cascade_deletion():
+            if not gap_sorts():
+                self.lock_siblings()
+                # a move committed since the object was loaded may have changed its sort,
+                # and a deletion committed meanwhile has already removed it
+                sort = self.siblings().filter(pk=self.pk).values_list('sort', flat=True).first()
+                if sort is None:
+                    return 0, {}
+                self.sort = sort
+            return super().delete(*args, **kwargs)
+
+    def siblings(self):
+        """Gives the queryset of the objects in the same container, the object included"""
+        raise NotImplementedError
 
-class TodoGroupModel(models.Model):
+    def lock_siblings(self):
+        """Locks the object's container until the end of the transaction, so the sorts
+        of its siblings aren't changed by other inserts, moves or deletes meanwhile"""
+        field = self._meta.get_field(self.container_field)
+        lock_container(field.related_model, getattr(self, field.attname))
+
+    @property
+    def position(self):
+        """The position of the object in its container, it's its sort
+        unless the sorts have gaps, then the objects up to it are counted"""
+        if not gap_sorts():
+            return self.sort
+        if getattr(self, '_position', None) is None:
+            self._position = self.siblings().filter(sort__lte=self.sort).count()
+        return self._position
+
+
+class TodoGroupModel(SortedModel):
     """The Model of the Todo Categories."""
 
+    container_field = 'user'
+
     sort = models.PositiveIntegerField(null=True)
-    user = models.ForeignKey(UserProfileModel, on_delete=models.CASCADE, related_name='todo_groups')
+    # the (user, sort) unique index covers the lookups by user
+    user = models.ForeignKey(UserProfileModel, on_delete=models.CASCADE, related_name='todo_groups',
+                             db_index=False)
     title = models.CharField(max_length=255)
 
     class Meta:
@@ -58,17 +154,24 @@ class TodoGroupModel(models.Model):
     def __str__(self):
         return self.title
 
+    def siblings(self):
+        return TodoGroupModel.objects.filter(user_id=self.user_id)
+
 
-class TodoModel(models.Model):
+class TodoModel(SortedModel):
     """The Model of the Todo item."""
 
+    container_field = 'category'
+
     todo_statuses = (
         ('C', 'Checked'),
         ('U', 'Unchecked')
     )
 
     sort = models.PositiveIntegerField(null=True)
-    category = models.ForeignKey(TodoGroupModel, on_delete=models.CASCADE, related_name='todos')
+    # the (category, sort) unique index covers the lookups by category
+    category = models.ForeignKey(TodoGroupModel, on_delete=models.CASCADE, related_name='todos',
+                                 db_index=False)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     status = models.CharField(max_length=1, choices=todo_statuses,
@@ -81,22 +184,83 @@ class TodoModel(models.Model):
     def __str__(self):
         return self.title
 
+    def siblings(self):
+        return TodoModel.objects.filter(category_id=self.category_id)
+
+
+ATTACHMENT_MAX_SIZE = 2 * 1000 * 1000
+ATTACHMENT_TOO_LARGE = 'File too large. Size should not exceed 2 MB.'
+
 
 def filesize(value):
     """Model Validator for file size limit"""
-    limit = 2 * 1000 * 1000
-    if value.size > limit:
-        raise ValidationError('File too large. Size should not exceed 2 MB.')
+    if value.size > ATTACHMENT_MAX_SIZE:
+        raise ValidationError(ATTACHMENT_TOO_LARGE)
+
 
+class AttachmentBlobModel(models.Model):
+    """The Model of a stored attachment file, the attachments with
+    the same content share one blob which counts their references."""
 
-class TodoAttachmentModel(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_upload)
+    size = models.PositiveIntegerField()
+    references = models.PositiveIntegerField(default=1)
+
+    @classmethod
+    def store(cls, file, filename):
+        """Gives the blob of a file's content and adds a reference to it,
+        the file is written to the storage only if no blob has its content yet.
+        The blob's row stays locked until the end of the transaction so it
+        can't be deleted by its last reference going away meanwhile.
+        It should be called inside a transaction.
+        Arguments:
+            file: the uploaded file.
+            filename: the name of the file sent by user.
+        Returns:
+            The blob holding the file's content.
+        """
+
+        blob, created = cls.objects.select_for_update().get_or_create(
+            sha256=file_sha256(file), defaults={'size': file.size})
+        if created:
+            blob.file.save(filename, file)
+        else:
+            cls.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+        return blob
+
+    def __str__(self):
+        return self.sha256
+
+
+class TodoAttachmentModel(SortedModel):
     """an alias to filefield to enable
     having multiple file attachments in a todo items"""
 
+    container_field = 'todo_item'
+
     sort = models.PositiveIntegerField(null=True)
-    todo_item = models.ForeignKey(TodoModel, on_delete=models.CASCADE, related_name='attachments')
+    # the (todo_item, sort) unique index covers the lookups by todo item
+    todo_item = models.ForeignKey(TodoModel, on_delete=models.CASCADE, related_name='attachments',
+                                  db_index=False)
     file = models.FileField(upload_to=attachment_upload, validators=[filesize])
+    # the attachments stored before the blobs have their own file and no blob
+    blob = models.ForeignKey(AttachmentBlobModel, on_delete=models.PROTECT, related_name='attachments',
+                             null=True)
 
     class Meta:
         unique_together = ("todo_item", "sort")
         ordering = ['sort']
+
+    def siblings(self):
+        return TodoAttachmentModel.objects.filter(todo_item_id=self.todo_item_id)
+
+    def save(self, *args, **kwargs):
+        """Stores the file of a new attachment in its content's blob
+        and points the attachment to the blob's file"""
+        if self.pk is None and self.blob_id is None and self.file and not self.file._committed:
+            with transaction.atomic():
+                self.blob = AttachmentBlobModel.store(self.file.file, self.file.name)
+                self.file = self.blob.file.name
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
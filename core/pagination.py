@@ -0,0 +1,46 @@
+from rest_framework.pagination import LimitOffsetPagination, CursorPagination
+
+
+class TodoGroupPagination(LimitOffsetPagination):
+    """The default pagination of the todo groups list,
+    pages are picked by their limit and offset."""
+
+    default_limit = 10
+    max_limit = 100
+
+
+class TodoGroupCursorPagination(CursorPagination):
+    """The keyset pagination of the todo groups list,
+    pages are picked by a cursor on the groups' (sort, id)
+    so it doesn't count the groups or scan the skipped ones."""
+
+    ordering = ('sort', 'id')
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class TodoSearchPagination(LimitOffsetPagination):
+    """The pagination of the todo items search results,
+    pages are picked by their limit and offset."""
+
+    default_limit = 20
+    max_limit = 100
+
+
+class TodoItemPagination(LimitOffsetPagination):
+    """The default pagination of a todo group's items,
+    pages are picked by their limit and offset."""
+
+    default_limit = 20
+    max_limit = 100
+
+
+class TodoItemCursorPagination(CursorPagination):
+    """The keyset pagination of a todo group's items,
+    pages are picked by a cursor on the items' (sort, id)."""
+
+    ordering = ('sort', 'id')
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
@@ -3,6 +3,12 @@ from rest_framework import permissions
 from core.models import UserProfileModel, TodoGroupModel, TodoModel
 
 
+def has_profile(request):
+    """Checks if the user is authenticated and has a valid profile,
+    the profile is loaded with the user by the UserProfileBackend."""
+    return request.user.is_authenticated and hasattr(request.user, 'profile')
+
+
 class UserProfilePermissions(permissions.BasePermission):
     """The Permission class used by UserProfileView."""
 
@@ -14,14 +20,14 @@ class UserProfilePermissions(permissions.BasePermission):
         """
         if request.method in self.safe_methods:
             return True
-        if request.user.is_authenticated and hasattr(request.user, 'profile'):
+        if has_profile(request):
             return True
         return False
 
     def has_object_permission(self, request, view, obj):
         """Checks if the user has permissions to update
         or delete a user profile"""
-        if obj.account == request.user:
+        if obj.account_id == request.user.pk:
             return True
         return False
 
@@ -31,7 +37,7 @@ class TodoGroupPermissions(permissions.BasePermission):
 
     def has_permission(self, request, view):
         """Checks if the user is authenticated and has a valid profile."""
-        if request.user.is_authenticated and hasattr(request.user, 'profile'):
+        if has_profile(request):
             return True
         return False
 
@@ -40,10 +46,10 @@ class TodoGroupPermissions(permissions.BasePermission):
         update or delete a todo group
         """
         if type(obj) == UserProfileModel:
-            if obj.account == request.user:
+            if obj.account_id == request.user.pk:
                 return True
             return False
-        if obj.user.account == request.user:
+        if obj.user_id == request.user.profile.pk:
             return True
         return False
 
@@ -53,7 +59,7 @@ class TodoPermissions(permissions.BasePermission):
 
     def has_permission(self, request, view):
         """Checks if the user is authenticated and has a valid profile."""
-        if request.user.is_authenticated and hasattr(request.user, 'profile'):
+        if has_profile(request):
             return True
         return False
 
@@ -62,16 +68,16 @@ class TodoPermissions(permissions.BasePermission):
         update or delete a todo
         """
         if type(obj) == UserProfileModel:
-            if obj.account == request.user:
+            if obj.account_id == request.user.pk:
                 return True
             return False
 
         if type(obj) == TodoGroupModel:
-            if obj.user.account == request.user:
+            if obj.user_id == request.user.profile.pk:
                 return True
             return False
 
-        if obj.category.user.account == request.user:
+        if obj.category.user_id == request.user.profile.pk:
             return True
         return False
 
@@ -81,7 +87,7 @@ class TodoAttachmentPermissions(permissions.BasePermission):
 
     def has_permission(self, request, view):
         """Checks if the user is authenticated and has a valid profile."""
-        if request.user.is_authenticated and hasattr(request.user, 'profile'):
+        if has_profile(request):
             return True
         return False
 
@@ -90,10 +96,28 @@ class TodoAttachmentPermissions(permissions.BasePermission):
         update or delete a todo
         """
         if type(obj) == TodoModel:
-            if obj.category.user.account == request.user:
+            if obj.category.user_id == request.user.profile.pk:
                 return True
             return False
 
-        if obj.todo_item.category.user.account == request.user:
+        if obj.todo_item.category.user_id == request.user.profile.pk:
+            return True
+        return False
+
+
+class BatchPermissions(permissions.BasePermission):
+    """The Permission class used by BatchView."""
+
+    def has_permission(self, request, view):
+        """Checks if the user is authenticated and has a valid profile."""
+        if has_profile(request):
+            return True
+        return False
+
+    def has_object_permission(self, request, view, obj):
+        """Checks if the user has the permissions to
+        change the todo groups and items of a user profile
+        """
+        if obj.account_id == request.user.pk:
             return True
         return False
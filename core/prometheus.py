@@ -0,0 +1,256 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# the default histogram buckets of the request latencies, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# the histogram buckets of the number of queries of a request
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def format_value(value):
+    """Gives a sample's value in the text format"""
+
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+
+def format_labels(labels):
+    """Gives the {name="value"} labels of a sample in the text format, escaping the values"""
+
+    if not labels:
+        return ''
+    return '{{{0}}}'.format(','.join('{0}="{1}"'.format(
+        name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels))
+
+
+class Metric:
+    """The base of the metrics, their values are kept by label values in the registry's state,
+    which is a plain dict of lists and numbers so it can be stored in JSON and summed"""
+
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    @property
+    def family(self):
+        """The name of the metric in its HELP and TYPE lines, the one of its samples"""
+
+        return self.name
+
+    def key(self, labels):
+        """Gives the key of the values of a set of labels in the metric's state"""
+
+        if set(labels) != set(self.labelnames):
+            raise ValueError('{0} needs the labels {1}'.format(self.name, ', '.join(self.labelnames)))
+        return json.dumps([str(labels[name]) for name in self.labelnames])
+
+    def labels(self, key):
+        """Gives the (name, value) pairs of the labels of a key"""
+
+        return list(zip(self.labelnames, json.loads(key)))
+
+
+class Counter(Metric):
+    """A metric whose values only go up"""
+
+    type = 'counter'
+
+    @property
+    def family(self):
+        """The counters' samples end with _total, the text format only types
+        the samples named like their family so it's named the same"""
+
+        return self.name + '_total'
+
+    def inc(self, amount=1, **labels):
+        """Adds an amount to the value of a set of labels"""
+
+        key = self.key(labels)
+        with self.registry.update() as state:
+            values = state.setdefault(self.name, {})
+            values[key] = values.get(key, 0) + amount
+
+    def merge(self, value, other):
+        return value + other
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield self.family, self.labels(key), value
+
+
+class Histogram(Metric):
+    """A metric counting the observed values in buckets, with their sum and count"""
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets) + (float('inf'),)
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, amount, **labels):
+        """Counts a value in the first bucket it fits in, for a set of labels"""
+
+        key = self.key(labels)
+        index = next(index for index, bound in enumerate(self.buckets) if amount <= bound)
+        with self.registry.update() as state:
+            # the counts of the buckets, then the sum of the values
+            values = state.setdefault(self.name, {}).setdefault(key, [0] * len(self.buckets) + [0.0])
+            values[index] += 1
+            values[-1] += amount
+
+    def merge(self, value, other):
+        return [a + b for a, b in zip(value, other)]
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            labels = self.labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, value):
+                cumulative += count
+                yield self.name + '_bucket', labels + [('le', format_value(float(bound)))], cumulative
+            yield self.name + '_sum', labels, value[-1]
+            yield self.name + '_count', labels, cumulative
+
+
+class Registry:
+    """The metrics of the process, exported in the Prometheus text format.
+    With a METRICS_DIR, every process writes its state in its own file there,
+    at most every METRICS_FLUSH_INTERVAL seconds and when it exits, and the
+    export sums the files of all the processes, so the metrics of every worker
+    of a pre-fork server are exported by any of them. The files of exited
+    processes are kept so their counts aren't lost, the directory
+    should be emptied when the server starts."""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def reset(self):
+        """Starts an empty state for the current process,
+        a forked worker doesn't count what its parent counted"""
+
+        self.pid = os.getpid()
+        self.state = {}
+        self.path = None
+        self.flushed_at = 0
+
+    @contextmanager
+    def update(self):
+        """The context in which the process' state is changed"""
+
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()
+            yield self.state
+
+    def state_path(self):
+        """Gives the file of the process' state in the METRICS_DIR, the name
+        is unique so a new process reusing an old one's pid doesn't overwrite it"""
+
+        if self.path is None:
+            self.path = os.path.join(settings.METRICS_DIR, '{0}-{1}.json'.format(os.getpid(), uuid.uuid4().hex))
+        return self.path
+
+    def flush(self, force=False):
+        """Writes the process' state in its file if there's a METRICS_DIR
+        and the last write is older than METRICS_FLUSH_INTERVAL, the file
+        is replaced at once so it's never read half written"""
+
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with self.update() as state:
+            path = self.state_path()
+            with open(path + '.tmp', 'w') as file:
+                json.dump(state, file)
+            os.replace(path + '.tmp', path)
+            self.flushed_at = now
+
+    def collect(self):
+        """Gives the state summed over all the processes"""
+
+        if not settings.METRICS_DIR:
+            with self.update() as state:
+                return copy.deepcopy(state)
+
+        self.flush(force=True)
+        total = {}
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as file:
+                    state = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for metric in self.metrics:
+                values = total.setdefault(metric.name, {})
+                for key, value in state.get(metric.name, {}).items():
+                    values[key] = metric.merge(values[key], value) if key in values else value
+        return total
+
+    def export(self):
+        """Gives the metrics of all the processes in the Prometheus text format"""
+
+        state = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP {0} {1}'.format(metric.family, metric.documentation))
+            lines.append('# TYPE {0} {1}'.format(metric.family, metric.type))
+            for name, labels, value in metric.samples(state.get(metric.name, {})):
+                lines.append('{0}{1} {2}'.format(name, format_labels(labels), format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+atexit.register(lambda: REGISTRY.flush(force=True))
+
+REQUESTS = Counter(REGISTRY, 'todo_http_requests', 'Requests by view, method and status.',
+                   ('view', 'method', 'status'))
+REQUEST_LATENCY = Histogram(REGISTRY, 'todo_http_request_duration_seconds', 'Request latencies by view.', ('view',))
+REQUEST_QUERIES = Histogram(REGISTRY, 'todo_db_queries_per_request', 'Database queries of the requests by view.',
+                            ('view',), buckets=QUERY_BUCKETS)
+REQUEST_DB_TIME = Histogram(REGISTRY, 'todo_db_duration_seconds', 'Database time of the requests by view.', ('view',))
+ATTACHMENT_UPLOADS = Counter(REGISTRY, 'todo_attachment_uploads', 'Attachment uploads by result.', ('result',))
+ATTACHMENT_UPLOAD_BYTES = Counter(REGISTRY, 'todo_attachment_upload_bytes', 'Attachment bytes received by result.',
+                                  ('result',))
+
+
+def observe_request(metrics, method, status):
+    """Records a request's metrics in the registry.
+    Arguments:
+        metrics: the RequestMetrics of the request.
+        method: the request's HTTP method.
+        status: the response's status code.
+    """
+
+    view = metrics.view or '-'
+    REQUESTS.inc(view=view, method=method, status=status)
+    REQUEST_LATENCY.observe(metrics.total_time, view=view)
+    REQUEST_QUERIES.observe(metrics.queries, view=view)
+    REQUEST_DB_TIME.observe(metrics.db_time, view=view)
+    REGISTRY.flush()
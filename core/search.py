@@ -0,0 +1,66 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+
+from core.models import TodoModel
+
+# the text search configuration of the todos' search vector, the GIN index
+# made in the migrations is built on the same expression so it must match
+SEARCH_CONFIG = 'english'
+
+# whether the pg_trgm extension is installed, it's checked once per process
+_trigram_installed = None
+
+
+def todo_search_vector():
+    """Gives the search vector of the todo items' titles and descriptions"""
+
+    return SearchVector('title', 'description', config=SEARCH_CONFIG)
+
+
+def trigram_installed():
+    """Checks if the database has the pg_trgm extension
+    used by the fuzzy search, some databases can't install it"""
+
+    global _trigram_installed
+    if _trigram_installed is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_installed = cursor.fetchone() is not None
+    return _trigram_installed
+
+
+def search_todos(user_id, text):
+    """Gives the todo items of a user matching a text, the best matches first.
+    The todos are matched by full-text search on their titles and descriptions,
+    using the search vector's GIN index.
+    Arguments:
+        user_id: the primary key of the user profile whose todos are searched.
+        text: the words searched for.
+    Returns:
+        The queryset of the matching todos, each one annotated with its rank.
+    """
+
+    query = SearchQuery(text, config=SEARCH_CONFIG)
+    return TodoModel.objects.select_related('category') \
+        .annotate(search=todo_search_vector(), rank=SearchRank(todo_search_vector(), query)) \
+        .filter(category__user_id=user_id, search=query) \
+        .order_by('-rank', 'pk')
+
+
+def fuzzy_search_todos(user_id, text):
+    """Gives the todo items of a user whose titles look like a text, the closest first.
+    It's used when the full-text search finds nothing, to match misspelled words,
+    and it finds nothing if the database has no pg_trgm extension.
+    Arguments:
+        user_id: the primary key of the user profile whose todos are searched.
+        text: the words searched for.
+    Returns:
+        The queryset of the matching todos, each one annotated with its rank.
+    """
+
+    if not trigram_installed():
+        return TodoModel.objects.none()
+    return TodoModel.objects.select_related('category') \
+        .annotate(rank=TrigramSimilarity('title', text)) \
+        .filter(category__user_id=user_id, title__trigram_similar=text) \
+        .order_by('-rank', 'pk')
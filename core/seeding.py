@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+
+from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel
+from core.sorting import sort_step
+
+
+def seed_users(prefix, users, groups, todos, attachments, file_name):
+    """Seeds users with todo groups, items and attachments in bulk inserts,
+    the bulk inserts don't send the post_save signals so nothing is cached.
+    Arguments:
+        prefix: the prefix of the seeded usernames, they are numbered after it.
+        users: the number of users to seed.
+        groups: the number of todo groups of every user.
+        todos: the number of todo items in every group.
+        attachments: the number of attachments of every todo item.
+        file_name: the name of the file in the media storage used by all the attachments.
+    Returns:
+        The seeded user profiles.
+    """
+
+    step = sort_step()
+    profiles = [UserProfileModel.objects.create(account=User.objects.create(username='{0}-{1}'.format(prefix, i)))
+                for i in range(users)]
+    TodoGroupModel.objects.bulk_create(
+        TodoGroupModel(user=profile, sort=sort * step, title='group')
+        for profile in profiles for sort in range(1, groups + 1))
+    seeded_groups = TodoGroupModel.objects.filter(user__in=profiles)
+    TodoModel.objects.bulk_create(
+        TodoModel(category=group, sort=sort * step, title='todo', status='UC'[sort % 2])
+        for group in seeded_groups for sort in range(1, todos + 1))
+    seeded_todos = TodoModel.objects.filter(category__user__in=profiles)
+    TodoAttachmentModel.objects.bulk_create(
+        TodoAttachmentModel(todo_item=todo, sort=sort * step, file=file_name)
+        for todo in seeded_todos for sort in range(1, attachments + 1))
+    return profiles
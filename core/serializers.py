@@ -1,9 +1,31 @@
 from django.contrib.auth.models import User
 from django.core import exceptions
 import django.contrib.auth.password_validation as validators
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
 
+from core.cache import bump_user_version
+from core.images import PHOTO_DERIVATIVE_SIZES, existing_photo_derivatives
+from core.metrics import serializer_timer
 from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel
+from core.signals import make_photo_derivatives
+from core.sorting import move_sort, next_sort, sort_step, gap_sorts, set_positions
+from core.tasks import run_in_background
+
+
+class TimedSerializerMixin:
+    """Records the time spent serializing the data in the request's metrics"""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """The serializer for the lists of objects whose serializing time is recorded"""
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -36,18 +58,36 @@ class UserSerializer(serializers.ModelSerializer):
         return data
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """The serializer for the user profile model"""
 
     account = UserSerializer()
+    profile_photo_derivatives = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfileModel
-        fields = ('account', 'profile_photo')
+        fields = ('account', 'profile_photo', 'profile_photo_derivatives')
         extra_kwargs = {
             'profile_photo': {'required': False},
         }
 
+    def get_profile_photo_derivatives(self, user_profile):
+        """Gives the urls of the profile photo's resized copies by size and format,
+        only the ones the background task already made are given. If a size is
+        missing, like when the task was lost with its worker, they're made again
+        in the background without waiting for them"""
+
+        photo = user_profile.profile_photo
+        if not photo:
+            return None
+
+        derivatives = existing_photo_derivatives(photo.name, photo.storage)
+        if len(derivatives) < len(PHOTO_DERIVATIVE_SIZES) and photo.storage.exists(photo.name):
+            run_in_background(make_photo_derivatives, user_profile.pk, photo.name, photo.storage)
+
+        return {size: {extension: photo.storage.url(name) for extension, name in formats.items()}
+                for size, formats in derivatives.items()}
+
     def create(self, validated_data):
         """Creates a new user profile from the request's data"""
 
@@ -77,8 +117,39 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return instance
 
 
-class TodoAttachmentSerializer(serializers.ModelSerializer):
-    """The serializer for the todo item attachment model"""
+class SortedListSerializer(TimedListSerializer):
+    """The serializer for the lists of objects of one container in the order
+    of their sorts, it gives them their positions at once in the gap sort mode"""
+
+    def to_representation(self, data):
+        """Sets the positions of the objects before they are shown,
+        a nested list holds all of its container's objects so it starts at 1"""
+
+        if gap_sorts():
+            nested = isinstance(data, models.Manager)
+            data = list(data.all() if nested else data)
+            # the filtered lists have their positions loaded by the view
+            if data and getattr(data[0], '_position', None) is None:
+                set_positions(data, 1 if nested else data[0].position)
+        return super().to_representation(data)
+
+
+class SortedSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """The base serializer for the sorted models,
+    their sort is shown as their position in their container"""
+
+    def to_representation(self, instance):
+        """Shows the object's position as its sort"""
+
+        data = super().to_representation(instance)
+        data['sort'] = instance.position
+        return data
+
+
+class TodoAttachmentSerializer(SortedSerializer):
+    """The serializer for the todo item attachment model,
+    its file is shown as the url of its download action
+    which checks the user's permissions before sending it"""
 
     class Meta:
         model = TodoAttachmentModel
@@ -86,9 +157,54 @@ class TodoAttachmentSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'sort': {'read_only': True}
         }
+        list_serializer_class = SortedListSerializer
+
+    def to_representation(self, instance):
+        """Shows the url of the attachment's download action as its file,
+        the todo item, group and user are the ones the views already loaded"""
+
+        data = super().to_representation(instance)
+        todo_item = instance.todo_item
+        category = todo_item.category
+        data['file'] = reverse('core:todo_attachments-download', kwargs={
+            'username': category.user.account.username,
+            'group_sort': category.position,
+            'item_sort': todo_item.position,
+            'pk': instance.position,
+        })
+        return data
+
+
+class TodoItemListSerializer(SortedListSerializer):
+    """The serializer for creating many todo items at once"""
+
+    def create(self, validated_data):
+        """creates all the todo items with a single insert
+        and gives them contiguous sorts in their groups,
+        bulk inserts don't send the post_save signals so
+        the cached todos of the groups' users are dropped here"""
+
+        with transaction.atomic():
+            sorts = dict()
+            todos = list()
+            for attrs in validated_data:
+                category = attrs['category']
+                if category.pk not in sorts:
+                    sorts[category.pk] = next_sort(TodoGroupModel, category.pk,
+                                                   TodoModel.objects.filter(category_id=category.pk))
+                todos.append(TodoModel(sort=sorts[category.pk], **attrs))
+                sorts[category.pk] += sort_step()
+
+            todos = TodoModel.objects.bulk_create(todos)
+
+        for user_id in {attrs['category'].user_id for attrs in validated_data}:
+            bump_user_version(user_id)
+
+        prefetch_related_objects(todos, 'attachments')
+        return todos
 
 
-class TodoItemSerializer(serializers.ModelSerializer):
+class TodoItemSerializer(SortedSerializer):
     """The serializer for the todo item model"""
 
     attachments = TodoAttachmentSerializer(many=True, read_only=True)
@@ -99,6 +215,18 @@ class TodoItemSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'sort': {'required': False}
         }
+        list_serializer_class = TodoItemListSerializer
+
+    def get_fields(self):
+        """Gives only the fields asked for in the context's todo_fields if it's set,
+        the sort is always given as it identifies the todo"""
+
+        fields = super().get_fields()
+        todo_fields = self.context.get('todo_fields')
+        if todo_fields is not None:
+            for name in set(fields) - set(todo_fields) - {'sort'}:
+                del fields[name]
+        return fields
 
     def validate_sort(self, sort):
         """validator for sort field"""
@@ -116,36 +244,33 @@ class TodoItemSerializer(serializers.ModelSerializer):
         instance.status = validated_data.get('status', instance.status)
         instance.description = validated_data.get('description', instance.description)
 
-        if validated_data.get('sort', None):
-            old_sort = instance.sort
-            new_sort = validated_data.get('sort')
-
-            instance.sort = None
-            instance.save()
-
-            if new_sort - old_sort > 0:
-                todos = instance.category.todos.filter(sort__gt=old_sort,
-                                                       sort__lte=new_sort,
-                                                       sort__isnull=False)
-                for todo in todos:
-                    todo.sort -= 1
-                    todo.save()
-
-            elif new_sort - old_sort < 0:
-                todos = instance.category.todos.filter(sort__lt=old_sort,
-                                                       sort__gte=new_sort,
-                                                       sort__isnull=False).order_by('-sort')
-                for todo in todos:
-                    todo.sort += 1
-                    todo.save()
-
-            instance.sort = new_sort
+        with transaction.atomic():
+            if validated_data.get('sort', None):
+                move_sort(instance, instance.category.todos.all(), validated_data.get('sort'))
             instance.save()
 
         return instance
 
 
-class TodoGroupSerializer(serializers.ModelSerializer):
+class TodoSearchSerializer(SortedSerializer):
+    """The serializer for the todo items found by a search,
+    they aren't contiguous so each one is given its own position"""
+
+    group_sort = serializers.SerializerMethodField()
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = TodoModel
+        fields = ('group_sort', 'sort', 'title', 'status', 'description', 'rank')
+        list_serializer_class = TimedListSerializer
+
+    def get_group_sort(self, todo):
+        """Gives the sort of the todo's group"""
+
+        return todo.category.position
+
+
+class TodoGroupSerializer(SortedSerializer):
     """The serializer for the todo group model"""
 
     todos = TodoItemSerializer(many=True, read_only=True)
@@ -156,6 +281,7 @@ class TodoGroupSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'sort': {'required': False}
         }
+        list_serializer_class = SortedListSerializer
 
     def validate_sort(self, sort):
         """validator for sort field"""
@@ -171,30 +297,96 @@ class TodoGroupSerializer(serializers.ModelSerializer):
 
         instance.title = validated_data.get('title', instance.title)
 
-        if validated_data.get('sort', None):
-            old_sort = instance.sort
-            new_sort = validated_data.get('sort')
-
-            instance.sort = None
-            instance.save()
-
-            if new_sort - old_sort > 0:
-                groups = instance.user.todo_groups.filter(sort__gt=old_sort,
-                                                          sort__lte=new_sort,
-                                                          sort__isnull=False)
-                for group in groups:
-                    group.sort -= 1
-                    group.save()
-
-            elif new_sort - old_sort < 0:
-                groups = instance.user.todo_groups.filter(sort__lt=old_sort,
-                                                          sort__gte=new_sort,
-                                                          sort__isnull=False).order_by('-sort')
-                for group in groups:
-                    group.sort += 1
-                    group.save()
-
-            instance.sort = new_sort
+        with transaction.atomic():
+            if validated_data.get('sort', None):
+                move_sort(instance, instance.user.todo_groups.all(), validated_data.get('sort'))
             instance.save()
 
         return instance
+
+
+class TodoGroupSummarySerializer(SortedSerializer):
+    """The serializer for the todo groups listed with the counts of their todos
+    instead of the todos themselves, the counts are annotated by the view"""
+
+    todos_count = serializers.IntegerField(read_only=True)
+    checked_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = TodoGroupModel
+        fields = ('sort', 'title', 'todos_count', 'checked_count')
+        list_serializer_class = SortedListSerializer
+
+
+class TodoQuerySerializer(serializers.Serializer):
+    """The serializer for the query parameters filtering the todo items of a group"""
+
+    status = serializers.ChoiceField(choices=TodoModel.todo_statuses, required=False)
+    fields = serializers.CharField(required=False)
+
+    def validate_fields(self, fields):
+        """validator for the comma separated names of the todo fields to show"""
+
+        fields = {field.strip() for field in fields.split(',') if field.strip()}
+        unknown = fields - set(TodoItemSerializer.Meta.fields)
+        if unknown:
+            raise serializers.ValidationError("unknown fields: {0}".format(', '.join(sorted(unknown))))
+        return fields
+
+
+class TodoListQuerySerializer(TodoQuerySerializer):
+    """The serializer for the query parameters filtering the todo items list"""
+
+    group = serializers.IntegerField(min_value=1, required=False)
+    summary = serializers.BooleanField(required=False, default=False)
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    """The serializer for a single operation of a batch request"""
+
+    resource_actions = {
+        'todo-group': ('create', 'update', 'destroy'),
+        'todo-item': ('create', 'update', 'partial_update', 'destroy'),
+    }
+
+    resource = serializers.ChoiceField(choices=tuple(resource_actions))
+    action = serializers.ChoiceField(choices=('create', 'update', 'partial_update', 'destroy'))
+    group_sort = serializers.IntegerField(required=False)
+    sort = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, data):
+        """Validates that the operation's action is allowed on its resource
+        and that it has the sorts needed to find its object"""
+
+        resource = data['resource']
+        action = data['action']
+        if action not in self.resource_actions[resource]:
+            raise serializers.ValidationError({'action': "{0} can't be done on a {1}".format(action, resource)})
+
+        required = []
+        if resource == 'todo-item':
+            required.append('group_sort')
+        if action != 'create':
+            required.append('sort')
+
+        errors = {field: ['This field is required.'] for field in required if field not in data}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+
+class BatchSerializer(serializers.Serializer):
+    """The serializer for a batch of todo groups and items operations"""
+
+    max_operations = 100
+
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        """validator for the number of operations"""
+
+        if len(operations) > self.max_operations:
+            raise serializers.ValidationError(
+                "a batch can't have more than {0} operations".format(self.max_operations))
+        return operations
@@ -1,10 +1,17 @@
-import os
+from collections import Counter
 
-from django.db.models import F
-from django.db.models.signals import post_delete, pre_save
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
-from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel
+from core.cache import bump_user_version, incr_user_version
+from core.deletion import defer_to_end, is_deleted, mark_deleted
+from core.images import generate_photo_derivatives
+from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel, AttachmentBlobModel
+from core.sorting import next_sort, gap_sorts, remove_sort
+from core.tasks import run_after_commit, remove_files_after_commit
 
 
 @receiver(post_delete, sender=UserProfileModel)
@@ -22,8 +29,8 @@ def add_sort_to_todo_group(sender, **kwargs):
 
     group = kwargs['instance']
     if not group.pk:
-        latest_sort = TodoGroupModel.objects.filter(user=group.user).count()
-        group.sort = latest_sort + 1
+        group.sort = next_sort(UserProfileModel, group.user_id,
+                               TodoGroupModel.objects.filter(user_id=group.user_id))
 
 
 @receiver(pre_save, sender=TodoModel)
@@ -33,8 +40,8 @@ def add_sort_to_todo_items(sender, **kwargs):
 
     todo = kwargs['instance']
     if not todo.pk:
-        latest_sort = TodoModel.objects.filter(category=todo.category).count()
-        todo.sort = latest_sort + 1
+        todo.sort = next_sort(TodoGroupModel, todo.category_id,
+                              TodoModel.objects.filter(category_id=todo.category_id))
 
 
 @receiver(pre_save, sender=TodoAttachmentModel)
@@ -44,43 +51,169 @@ def add_sort_to_todo_attachment(sender, **kwargs):
 
     attachment = kwargs['instance']
     if not attachment.pk:
-        latest_sort = TodoAttachmentModel.objects.filter(todo_item=attachment.todo_item).count()
-        attachment.sort = latest_sort + 1
+        attachment.sort = next_sort(TodoModel, attachment.todo_item_id,
+                                    TodoAttachmentModel.objects.filter(todo_item_id=attachment.todo_item_id))
+
+
+@receiver(pre_delete, sender=UserProfileModel)
+@receiver(pre_delete, sender=TodoGroupModel)
+@receiver(pre_delete, sender=TodoModel)
+def mark_deleted_container(sender, **kwargs):
+    """The receiver called before a user profile, todo group or todo item
+    is deleted to let the receivers of its deleted children know about it"""
+
+    mark_deleted(kwargs['instance'])
 
 
 @receiver(post_delete, sender=TodoGroupModel)
 def resort_todo_groups(sender, **kwargs):
     """The receiver called after a todo group is deleted
-    to resort them"""
+    to resort them, unless its user profile is deleted too
+    or the sorts have gaps"""
 
     group = kwargs['instance']
-    group.user.todo_groups.filter(sort__gt=group.sort).update(sort=F('sort') - 1)
+    if gap_sorts() or is_deleted(UserProfileModel, group.user_id):
+        return
+    remove_sort(UserProfileModel, group.user_id,
+                TodoGroupModel.objects.filter(user_id=group.user_id), group.sort)
 
 
 @receiver(post_delete, sender=TodoModel)
 def resort_todo_items(sender, **kwargs):
     """The receiver called after a Todo item is deleted
-    to resort them"""
+    to resort them, unless its todo group is deleted too
+    or the sorts have gaps"""
 
     todo = kwargs['instance']
-    todo.category.todos.filter(sort__gt=todo.sort).update(sort=F('sort') - 1)
+    if gap_sorts() or is_deleted(TodoGroupModel, todo.category_id):
+        return
+    remove_sort(TodoGroupModel, todo.category_id,
+                TodoModel.objects.filter(category_id=todo.category_id), todo.sort)
 
 
 @receiver(post_delete, sender=TodoAttachmentModel)
 def resort_todo_attachment(sender, **kwargs):
     """The receiver called after a todo attachment is deleted
-    to resort them"""
+    to resort them, unless its todo item is deleted too
+    or the sorts have gaps"""
 
     attachment = kwargs['instance']
-    attachment.todo_item.attachments.filter(sort__gt=attachment.sort).update(sort=F('sort') - 1)
+    if gap_sorts() or is_deleted(TodoModel, attachment.todo_item_id):
+        return
+    remove_sort(TodoModel, attachment.todo_item_id,
+                TodoAttachmentModel.objects.filter(todo_item_id=attachment.todo_item_id), attachment.sort)
 
 
 @receiver(post_delete, sender=TodoAttachmentModel)
 def delete_todo_attachment_file(sender, **kwargs):
     """The receiver called after a todo attachment is deleted
-    to delete the file it pointes to in the filesystem"""
+    to remove its reference from its blob, and delete the blob
+    and the file it pointes to in the filesystem once it was the last one,
+    the blobs of the attachments deleted together are released at once
+    and the files are removed in the background after the deletion is committed"""
+
+    attachment = kwargs['instance']
+    if attachment.blob_id is not None:
+        if not defer_to_end(release_blobs, attachment.blob_id):
+            with transaction.atomic():
+                release_blobs([attachment.blob_id])
+    elif attachment.file:
+        remove_files_after_commit(attachment.file.path)
+
+
+def release_blobs(blob_ids):
+    """Removes the references of deleted attachments from their blobs in one query,
+    then deletes the blobs that have no reference left and their files.
+    Arguments:
+        blob_ids: the blob id of every deleted attachment, repeated for the
+                  attachments sharing a blob.
+    """
+
+    counts = Counter(blob_ids)
+    blobs = AttachmentBlobModel.objects.filter(pk__in=counts)
+    blobs.update(references=F('references') - Case(
+        *(When(pk=pk, then=Value(count)) for pk, count in counts.items()),
+        output_field=PositiveIntegerField()))
+    unreferenced = blobs.filter(references=0)
+    paths = [blob.file.path for blob in unreferenced.only('file')]
+    if paths:
+        unreferenced.delete()
+        remove_files_after_commit(*paths)
+
+
+@receiver(post_save, sender=UserProfileModel)
+def bump_user_profile_version(sender, **kwargs):
+    """The receiver called after a user profile is saved
+    to change its version"""
+
+    bump_user_version(kwargs['instance'].pk)
+
+
+@receiver(post_save, sender=User)
+def bump_user_account_version(sender, **kwargs):
+    """The receiver called after a user account is saved
+    to change its profile's version, logging in only
+    updates the last login date which isn't sent"""
+
+    update_fields = kwargs['update_fields']
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    try:
+        bump_user_version(kwargs['instance'].profile.pk)
+    except UserProfileModel.DoesNotExist:
+        pass
+
+
+@receiver(post_save, sender=TodoGroupModel)
+@receiver(post_delete, sender=TodoGroupModel)
+def bump_todo_group_user_version(sender, **kwargs):
+    """The receiver called after a todo group is saved or deleted
+    to drop the cached todos of its user, unless the user profile is deleted too"""
+
+    group = kwargs['instance']
+    if not is_deleted(UserProfileModel, group.user_id):
+        bump_user_version(group.user_id)
+
+
+@receiver(post_save, sender=TodoModel)
+@receiver(post_delete, sender=TodoModel)
+def bump_todo_item_user_version(sender, **kwargs):
+    """The receiver called after a todo item is saved or deleted
+    to drop the cached todos of its user, the todo group's
+    receiver does it when they are deleted together"""
+
+    todo = kwargs['instance']
+    if not is_deleted(TodoGroupModel, todo.category_id):
+        bump_user_version(todo.category.user_id)
+
+
+@receiver(post_save, sender=TodoAttachmentModel)
+@receiver(post_delete, sender=TodoAttachmentModel)
+def bump_todo_attachment_user_version(sender, **kwargs):
+    """The receiver called after a todo attachment is saved or deleted
+    to drop the cached todos of its user, the todo item's
+    receiver does it when they are deleted together"""
 
     attachment = kwargs['instance']
-    if attachment.file:
-        if os.path.isfile(attachment.file.path):
-            os.remove(attachment.file.path)
+    if not is_deleted(TodoModel, attachment.todo_item_id):
+        bump_user_version(attachment.todo_item.category.user_id)
+
+
+@receiver(post_save, sender=UserProfileModel)
+def make_profile_photo_derivatives(sender, **kwargs):
+    """The receiver called after a user profile is saved
+    to make the resized copies of its photo in the background"""
+
+    user_profile = kwargs['instance']
+    photo = user_profile.profile_photo
+    if photo:
+        run_after_commit(make_photo_derivatives, user_profile.pk, photo.name, photo.storage)
+
+
+def make_photo_derivatives(profile_id, photo_name, storage):
+    """Makes the resized copies of a profile photo, then changes the user's version
+    so the profile's ETags sent before the copies were made don't match anymore,
+    it's kept if no copy was written"""
+
+    if generate_photo_derivatives(photo_name, storage):
+        incr_user_version(profile_id)
@@ -0,0 +1,228 @@
+from django.conf import settings
+from django.db.models import F, IntegerField, Max, Value, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404
+
+# sorts are moved above this offset while they are being shifted
+# so the unique (container, sort) pairs never collide mid update
+SHIFT_OFFSET = 2 ** 30
+
+# the space left between the sorts of neighbours in the gap sort mode
+SORT_GAP = 1024
+
+
+def gap_sorts():
+    """Checks if the sorts are stored with gaps between them (the 'gap' SORT_MODE)
+    instead of being the positions 1..n of the objects (the 'dense' SORT_MODE)"""
+
+    return settings.SORT_MODE == 'gap'
+
+
+def sort_step():
+    """Gives the difference between the sorts of two objects added one after the other"""
+
+    return SORT_GAP if gap_sorts() else 1
+
+
+def move_sort(instance, siblings, new_sort):
+    """Moves an instance to a new sort in its container.
+    Shifts the siblings between the old and the new sort by one
+    using range updates, so the number of queries doesn't depend
+    on the distance of the move, or only changes the instance's sort
+    in the gap sort mode. The container is locked like in next_sort
+    so inserts and deletes wait for the move. It should be called inside a transaction
+    and the instance must be saved afterwards to store its new sort.
+    Raises Http404 if the instance was deleted since it was loaded.
+    Arguments:
+        instance: the todo group, item or attachment that is moved.
+        siblings: the queryset of all the objects in the same container
+                  as the instance, the instance itself included.
+        new_sort: the position that the instance will be moved to.
+    """
+
+    # the sort is read again once the container is locked, a delete
+    # committed since the instance was loaded may have shifted it or removed the instance
+    instance.lock_siblings()
+    sort = siblings.filter(pk=instance.pk).values_list('sort', flat=True).first()
+    if sort is None:
+        raise Http404
+    instance.sort = sort
+
+    if gap_sorts():
+        move_between(instance, siblings, new_sort)
+        return
+
+    old_sort = instance.sort
+    if new_sort == old_sort:
+        return
+
+    siblings.filter(pk=instance.pk).update(sort=None)
+
+    if new_sort > old_sort:
+        shifted = siblings.filter(sort__gt=old_sort, sort__lte=new_sort)
+        step = -1
+    else:
+        shifted = siblings.filter(sort__gte=new_sort, sort__lt=old_sort)
+        step = 1
+
+    shift_sorts(siblings, shifted, step)
+
+    instance.sort = new_sort
+
+
+def remove_sort(container_model, container_pk, siblings, sort):
+    """Closes the gap left by an object removed from its container,
+    the siblings after it are moved up by one. The container is locked
+    like in next_sort so an insert can't read the biggest sort before
+    the shift is committed. It should be called inside a transaction.
+    Arguments:
+        container_model: the model of the container (user profile, todo group or todo item).
+        container_pk: the primary key of the container the object is removed from.
+        siblings: the queryset of the objects left in the container.
+        sort: the sort of the removed object.
+    """
+
+    lock_container(container_model, container_pk)
+    shift_sorts(siblings, siblings.filter(sort__gt=sort), -1)
+
+
+def shift_sorts(siblings, shifted, step):
+    """Adds a step to the sorts of some of the objects of a container.
+    The database checks the (container, sort) unique index row by row
+    in the order the rows are stored, not in the order of their sorts,
+    so they are moved above SHIFT_OFFSET first and then down to their
+    new sort, where they can't collide with the ones not shifted yet.
+    Arguments:
+        siblings: the queryset of all the objects of the container.
+        shifted: the queryset of the objects whose sorts are shifted.
+        step: the number added to their sorts.
+    """
+
+    shifted.update(sort=F('sort') + SHIFT_OFFSET)
+    siblings.filter(sort__gt=SHIFT_OFFSET).update(sort=F('sort') - SHIFT_OFFSET + step)
+
+
+def next_sort(container_model, container_pk, siblings):
+    """Gives the sort that a new object added to a container should take.
+    Locks the container's row until the end of the transaction so concurrent
+    inserts in the same container wait for each other instead of taking
+    the same sort, then reads the biggest sort from the (container, sort)
+    unique index instead of counting all the objects in the container.
+    It should be called inside a transaction.
+    Arguments:
+        container_model: the model of the container (user profile, todo group or todo item).
+        container_pk: the primary key of the container the object is added to.
+        siblings: the queryset of all the objects already in the container.
+    Returns:
+        The sort after the last one in the container.
+    """
+
+    lock_container(container_model, container_pk)
+    last_sort = siblings.aggregate(last_sort=Max('sort'))['last_sort']
+    return (last_sort or 0) + sort_step()
+
+
+def lock_container(container_model, container_pk):
+    """Locks a container's row until the end of the transaction, the inserts,
+    moves and deletes changing the sorts of its objects take this lock first
+    so they wait for each other instead of reading sorts another one is changing.
+    It should be called inside a transaction.
+    Arguments:
+        container_model: the model of the container (user profile, todo group or todo item).
+        container_pk: the primary key of the container.
+    """
+
+    list(container_model.objects.select_for_update().filter(pk=container_pk).values_list('pk'))
+
+
+def move_between(instance, siblings, position):
+    """Moves an instance to a position in its container in the gap sort mode.
+    Gives it the sort halfway between the ones of its new neighbours so only
+    its own row is written, the sorts of the container are spread out again
+    when there's no gap left between the neighbours.
+    Arguments:
+        instance: the todo group, item or attachment that is moved.
+        siblings: the queryset of all the objects in the same container
+                  as the instance, the instance itself included.
+        position: the position that the instance will be moved to.
+    """
+
+    others = siblings.exclude(pk=instance.pk).order_by('sort')
+    neighbours = list(others.values_list('sort', flat=True)[max(position - 2, 0):position])
+    if position == 1:
+        before, after = 0, neighbours[0] if neighbours else None
+    else:
+        before, after = neighbours[0], neighbours[1] if len(neighbours) > 1 else None
+
+    if after is None:
+        if instance.sort <= before:
+            instance.sort = before + SORT_GAP
+    elif not before < instance.sort < after:
+        if after - before > 1:
+            instance.sort = (before + after) // 2
+        else:
+            spread_sorts(instance, siblings, list(others.only('pk', 'sort')), position)
+    instance._position = position
+
+
+def spread_sorts(instance, siblings, others, position):
+    """Gives the objects of a container sorts spread by SORT_GAP again,
+    with the instance at its new position. The sorts are cleared first
+    so the new ones never collide with the old ones mid update."""
+
+    siblings.update(sort=None)
+    ordered = others[:position - 1] + [instance] + others[position - 1:]
+    for index, obj in enumerate(ordered, start=1):
+        obj.sort = index * SORT_GAP
+    type(instance).objects.bulk_update(others, ['sort'])
+
+
+def at_position(queryset, position):
+    """Filters the objects of a container down to the one at a position,
+    it's the one with that sort unless the sorts have gaps,
+    then the object found is given its position.
+    Arguments:
+        queryset: the queryset of the objects of one container.
+        position: the position of the object, starting from 1.
+    Returns:
+        The filtered queryset.
+    """
+
+    if not gap_sorts():
+        return queryset.filter(sort=position)
+    try:
+        position = int(position)
+    except ValueError:
+        return queryset.none()
+    if position < 1:
+        return queryset.none()
+    return queryset.filter(pk__in=queryset.order_by('sort').values('pk')[position - 1:position]) \
+        .annotate(_position=Value(position, output_field=IntegerField()))
+
+
+def set_positions(objects, first_position):
+    """Stores the positions of contiguous objects of a container,
+    so they aren't counted one by one when they are shown in the gap sort mode.
+    Arguments:
+        objects: the objects in the order of their sorts.
+        first_position: the position of the first object.
+    """
+
+    for position, obj in enumerate(objects, start=first_position):
+        obj._position = position
+
+
+def load_positions(objects, siblings, container):
+    """Gives their positions to some of the objects of containers in the gap sort mode,
+    all the objects of the containers are numbered in one query.
+    Arguments:
+        objects: the objects whose positions are needed.
+        siblings: the queryset of all the objects of the objects' containers.
+        container: the name of the objects' container foreign key.
+    """
+
+    positions = dict(siblings.annotate(
+        position=Window(RowNumber(), partition_by=[F(container)], order_by=F('sort').asc())
+    ).values_list('pk', 'position'))
+    for obj in objects:
+        obj._position = positions[obj.pk]
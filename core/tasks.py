@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# created on the first task so every pre-forked worker process has its own threads
+_executor = None
+
+# the files waiting to be removed by the background threads
+_removed_paths = []
+_removed_paths_lock = threading.Lock()
+
+
+def get_executor():
+    """Gives the pool of threads running the background tasks"""
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_TASKS_WORKERS,
+                                       thread_name_prefix='core-tasks')
+    return _executor
+
+
+def run_task(func, *args, **kwargs):
+    """Runs a task and logs its errors instead of losing them in its future"""
+
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+
+
+def run_thread_task(func, *args, **kwargs):
+    """Runs a task in a background thread, then closes the thread's database
+    connection if it's broken or older than CONN_MAX_AGE, like after a request"""
+
+    try:
+        run_task(func, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Runs a function in the background threads so the request
+    doesn't wait for it, or right away if BACKGROUND_TASKS_EAGER is set.
+    Arguments:
+        func: the task's function, it runs outside of the request's
+              transaction, with its own database connection.
+        args, kwargs: the arguments the function is called with.
+    """
+
+    if settings.BACKGROUND_TASKS_EAGER:
+        run_task(func, *args, **kwargs)
+    else:
+        get_executor().submit(run_thread_task, func, *args, **kwargs)
+
+
+def run_after_commit(func, *args, **kwargs):
+    """Runs a function in the background once the current transaction
+    is committed, nothing is run if it's rolled back"""
+
+    transaction.on_commit(lambda: run_in_background(func, *args, **kwargs))
+
+
+def remove_files_after_commit(*paths):
+    """Removes files from the filesystem in the background once the current
+    transaction is committed, so the rows that were deleted in the transaction
+    don't wait for their files and the files are kept if it's rolled back.
+    Arguments:
+        paths: the absolute paths of the files.
+    """
+
+    if not paths:
+        return
+    transaction.on_commit(lambda: queue_removed_files(paths))
+
+
+def queue_removed_files(paths):
+    """Adds files to the ones waiting to be removed, the removal task is
+    started only if it isn't already waiting so the files are removed in batches"""
+
+    with _removed_paths_lock:
+        idle = not _removed_paths
+        _removed_paths.extend(paths)
+    if idle:
+        run_in_background(remove_queued_files)
+
+
+def remove_queued_files():
+    """Removes all the files waiting to be removed"""
+
+    with _removed_paths_lock:
+        paths = list(_removed_paths)
+        _removed_paths.clear()
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
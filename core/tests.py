@@ -1,2 +0,0 @@
-
-# Create your tests here.
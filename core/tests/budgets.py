@@ -0,0 +1,49 @@
+import re
+
+# the most queries each view may run when it's requested by the tests,
+# the two queries reading the session and the user are included
+QUERY_BUDGETS = {
+    'UserProfileView.retrieve': 4,
+    'UserProfileView.destroy': 16,
+    'TodoGroupView.create': 9,
+    'TodoGroupView.update': 18,
+    'TodoGroupView.destroy': 13,
+    'TodoView.list': 7,
+    'TodoView.group_list': 6,
+    'TodoView.search': 5,
+    'TodoView.retrieve': 4,
+    'TodoView.create': 9,
+    'TodoView.update': 7,
+    'TodoView.partial_update': 13,
+    'TodoView.destroy': 11,
+    'TodoAttachmentView.download': 3,
+    'TodoAttachmentView.destroy': 9,
+    'BatchView.create': 18,
+}
+
+SERVER_TIMING_RE = re.compile(r'(\w+);(?:desc="([^"]*)"|dur=([\d.]+))')
+
+
+def server_timing(response):
+    """Gives the metrics of a response's Server-Timing header by name,
+    the descriptions as strings and the durations as floats"""
+
+    return {name: desc if desc else float(duration)
+            for name, desc, duration in SERVER_TIMING_RE.findall(response['Server-Timing'])}
+
+
+class QueryBudgetMixin:
+    """Mixin for the test cases checking that the views don't run more queries than their budgets,
+    so a view that starts running a query per object fails the tests"""
+
+    query_budgets = QUERY_BUDGETS
+
+    def assertQueryBudget(self, response):
+        """Checks that the view of a response ran at most its budget of queries"""
+
+        metrics = server_timing(response)
+        view = metrics['view']
+        self.assertIn(view, self.query_budgets, 'the view {0} has no query budget'.format(view))
+        queries = int(metrics['queries'])
+        self.assertLessEqual(queries, self.query_budgets[view], '{0} ran {1} queries, its budget is {2}'.format(
+            view, queries, self.query_budgets[view]))
@@ -0,0 +1,90 @@
+import json
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.seeding import seed_users
+from core.tests.budgets import QueryBudgetMixin, server_timing
+
+
+class TestQueryBudgets(QueryBudgetMixin, TestCase):
+    """Unit Test for the views' query budgets and the request metrics"""
+
+    def setUp(self):
+        """setup for unittest"""
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        file_name = default_storage.save('attachments/budget', ContentFile(b'budget'))
+        profile = seed_users('budget-user', 2, groups=5, todos=5, attachments=2, file_name=file_name)[0]
+        self.username = profile.account.username
+        self.client.force_login(profile.account)
+
+    def test_query_budgets(self):
+        """Test that every view stays in its query budget with more than one object of each kind"""
+
+        user = {'username': self.username}
+        group = dict(user, pk=1)
+        todos = {'username': self.username, 'group_sort': 1}
+        todo = dict(todos, pk=1)
+        attachment = dict(todos, item_sort=1, pk=1)
+        requests = [
+            ('get', reverse('core:user-details', kwargs=user), None),
+            ('get', reverse('core:todo-list', kwargs=user), None),
+            ('get', reverse('core:todo-list', kwargs=user) + '?pagination=cursor&summary=true', None),
+            ('get', reverse('core:todo-search', kwargs=user) + '?q=todo', None),
+            ('get', reverse('core:todo-create', kwargs=todos), None),
+            ('get', reverse('core:todo-detail', kwargs=todo), None),
+            ('get', reverse('core:todo_attachments-download', kwargs=attachment), None),
+            ('post', reverse('core:todo_groups-list', kwargs=user), {'title': 'title'}),
+            ('put', reverse('core:todo_groups-detail', kwargs=group), {'sort': 5, 'title': 'title'}),
+            ('post', reverse('core:todo-create', kwargs=todos), [{'title': 'title'}] * 5),
+            ('patch', reverse('core:todo-detail', kwargs=todo), {'sort': 5}),
+            ('put', reverse('core:todo-detail', kwargs=todo), {'title': 'title', 'status': 'C'}),
+            ('post', reverse('core:batch', kwargs=user), {'operations': [
+                {'resource': 'todo-item', 'action': 'create', 'group_sort': 1, 'data': {'title': 'title'}},
+                {'resource': 'todo-item', 'action': 'partial_update', 'group_sort': 1, 'sort': 1, 'data': {}},
+            ]}),
+            ('delete', reverse('core:todo_attachments-detail', kwargs=attachment), None),
+            ('delete', reverse('core:todo-detail', kwargs=todo), None),
+            ('delete', reverse('core:todo_groups-detail', kwargs=group), None),
+            ('delete', reverse('core:user-details', kwargs=user), None),
+        ]
+
+        for method, url, data in requests:
+            response = getattr(self.client, method)(url, json.dumps(data), content_type='application/json') \
+                if data is not None else getattr(self.client, method)(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, url)
+            self.assertQueryBudget(response)
+
+    def test_request_metrics(self):
+        """Test that the request metrics are sent in the Server-Timing header and logged"""
+
+        url = reverse('core:todo-list', kwargs={'username': self.username})
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            response = self.client.get(url)
+
+        metrics = server_timing(response)
+        self.assertEqual(metrics['view'], 'TodoView.list')
+        self.assertEqual(int(metrics['queries']), 7)
+        self.assertLessEqual(metrics['serializer'], metrics['total'])
+        self.assertLessEqual(metrics['db'], metrics['total'])
+
+        record = logs.records[0]
+        self.assertEqual(record.metrics['view'], 'TodoView.list')
+        self.assertIn('path={0} status=200 view=TodoView.list queries=7'.format(url), record.getMessage())
+
+        # the requests that don't reach a view have metrics too
+        response = self.client.get('/not-found/')
+        self.assertEqual(server_timing(response)['view'], '-')
@@ -0,0 +1,99 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from django.test import LiveServerTestCase, TestCase
+from django.urls import URLResolver
+
+from core import urls
+
+from core.management.commands.explain_queries import Command as ExplainQueriesCommand
+from core.models import TodoModel
+from core.tests.media import TemporaryMediaMixin
+
+
+class TestExplainQueries(TestCase):
+    """Unittest for the explain_queries command"""
+
+    def test_indexed_queries(self):
+        """test that the views' queries use indexes"""
+
+        out = StringIO()
+        call_command('explain_queries', users=2, groups=3, todos=3, attachments=1, stdout=out)
+        self.assertNotIn('sequential scan', out.getvalue())
+
+    def test_sequential_scan(self):
+        """test that a query reading a whole table is flagged"""
+
+        class Command(ExplainQueriesCommand):
+            def view_queries(self, username):
+                return super().view_queries(username) + [('by title', TodoModel.objects.filter(title='title'))]
+
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, 'by title'):
+            call_command(Command(), users=2, groups=3, todos=3, attachments=1, stdout=out)
+        self.assertIn('by title: sequential scan on core_todomodel', out.getvalue())
+
+
+def url_names(patterns):
+    """Gives the names of the url patterns and of the patterns they include"""
+
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class TestBenchmark(TestCase):
+    """Unittest for the benchmark command"""
+
+    def test_benchmark(self):
+        """test that every route is benchmarked and reported in JSON"""
+
+        out = StringIO()
+        call_command('benchmark', users=2, groups=2, todos=2, attachments=1, iterations=2, warmup=0, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['seed'], {'users': 2, 'groups': 2, 'todos': 2, 'attachments': 1})
+        self.assertEqual({route['url_name'] for route in report['routes']}, url_names(urls.urlpatterns) - {'api-root'})
+        for route in report['routes']:
+            self.assertLess(route['status'], 400, route['route'])
+            self.assertLessEqual(route['p50_ms'], route['p99_ms'])
+            self.assertGreater(route['requests_per_second'], 0)
+        self.assertGreater(report['routes'][0]['queries'], 0)
+
+        # the seeded data is rolled back
+        self.assertFalse(TodoModel.objects.exists())
+
+    def test_route_filter(self):
+        """test that only the asked for routes are benchmarked"""
+
+        out = StringIO()
+        call_command('benchmark', users=1, groups=1, todos=1, attachments=1, iterations=1, warmup=0,
+                     route=['todo-list'], stdout=out)
+        self.assertEqual({route['url_name'] for route in json.loads(out.getvalue())['routes']}, {'todo-list'})
+
+
+class TestLoadTest(TemporaryMediaMixin, LiveServerTestCase):
+    """Unittest for the loadtest command"""
+
+    def test_load_test(self):
+        """test that the read endpoints of a running server are load tested and the seeded user is deleted"""
+
+        out = StringIO()
+        call_command('loadtest', self.live_server_url, label='live', concurrency=2, requests=4,
+                     slow_client_delay=0.01, groups=2, todos=2, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['label'], 'live')
+        self.assertEqual([route['route'] for route in report['routes']],
+                         ['UserProfileView.retrieve', 'TodoView.list', 'TodoView.group_list', 'TodoView.retrieve'])
+        for route in report['routes']:
+            self.assertEqual(route['errors'], {}, route['route'])
+            self.assertGreater(route['requests_per_second'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-user-').exists())
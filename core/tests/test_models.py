@@ -1,10 +1,23 @@
 import os
+import random
+import shutil
+import tempfile
+import threading
+from unittest import skipUnless
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from core.models import TodoGroupModel, TodoModel, TodoAttachmentModel, UserProfileModel, users_upload, \
-    attachment_upload
+    attachment_upload, AttachmentBlobModel
+from core.sorting import move_sort
+from core.tasks import remove_files_after_commit
+from core.tests.media import TemporaryMediaMixin
 
 
 class TestUsers(TestCase):
@@ -57,6 +70,42 @@ class TestTodoGroup(TestCase):
         group2.refresh_from_db()
         self.assertEqual(group2.sort, 1)  # resorted from signals
 
+    def test_cascade_delete_query_count(self):
+        """test for deleting a todo group without resorting its deleted todos
+        or releasing the blobs of their attachments one by one"""
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+        shared = TodoGroupModel.objects.create(user=user_profile, title='shared')
+        shared_todo = TodoModel.objects.create(category=shared, title='todo')
+
+        def delete_queries(count):
+            group = TodoGroupModel.objects.create(user=user_profile, title='group')
+            TodoGroupModel.objects.create(user=user_profile, title='next group')
+            for i in range(count):
+                todo = TodoModel.objects.create(category=group, title='todo')
+                TodoAttachmentModel.objects.create(todo_item=todo, file=SimpleUploadedFile(
+                    name='file.txt', content='content {0} {1}'.format(count, i).encode()))
+            # the blob of another group's attachment is kept
+            TodoAttachmentModel.objects.create(todo_item=todo, file=SimpleUploadedFile(
+                name='file.txt', content=b'shared'))
+
+            group = TodoGroupModel.objects.get(pk=group.pk)
+            with CaptureQueriesContext(connection) as queries:
+                group.delete()
+            return len(queries)
+
+        with override_settings(MEDIA_ROOT=media_root):
+            TodoAttachmentModel.objects.create(todo_item=shared_todo, file=SimpleUploadedFile(
+                name='file.txt', content=b'shared'))
+            self.assertEqual(delete_queries(2), delete_queries(20))
+
+        self.assertEqual(list(user_profile.todo_groups.values_list('sort', 'title')),
+                         [(1, 'shared'), (2, 'next group'), (3, 'next group')])  # resorted from signals
+        self.assertEqual(list(AttachmentBlobModel.objects.values_list('references', flat=True)), [1])
+
     def test_todo_group_str(self):
         """test for todo group __str__ function"""
 
@@ -88,6 +137,46 @@ class TestTodo(TestCase):
         todo2.refresh_from_db()
         self.assertEqual(todo2.sort, 1)  # resorted from signals
 
+    def test_stale_delete_and_move(self):
+        """test for deleting and moving a todo item already deleted through another instance"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+        group = TodoGroupModel.objects.create(user=user_profile, title='group')
+        todo = TodoModel.objects.create(category=group, title='todo1')
+        TodoModel.objects.create(category=group, title='todo2')
+
+        stale_todo = TodoModel.objects.get(pk=todo.pk)
+        todo.delete()
+
+        self.assertEqual(stale_todo.delete(), (0, {}))
+        with self.assertRaises(Http404), transaction.atomic():
+            move_sort(stale_todo, group.todos.all(), 1)
+        self.assertEqual(list(group.todos.values_list('sort', 'title')), [(1, 'todo2')])
+
+    def test_delete_unordered_rows(self):
+        """test for resorting todo items whose rows aren't stored in the order
+        of their sorts, like after moves, the database checks the unique sorts
+        row by row in the order they are stored"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+        group = TodoGroupModel.objects.create(user=user_profile, title='group')
+        todos = [TodoModel.objects.create(category=group, title=str(i)) for i in range(6)]
+
+        # the rows are rewritten from the last sort to the first
+        group.todos.update(sort=None)
+        for todo in reversed(todos):
+            TodoModel.objects.filter(pk=todo.pk).update(sort=todo.sort)
+
+        # the shifted rows are read in the order they are stored, not from the index
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_indexscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+        todos[0].delete()
+        self.assertEqual(list(group.todos.values_list('sort', 'title')),
+                         [(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')])
+
     def test_todo_str(self):
         """test for todo item __str__ unction"""
 
@@ -101,12 +190,101 @@ class TestTodo(TestCase):
         self.assertEqual(todo1.__str__(), todo1.title)
 
 
-class TestTodoAttachment(TestCase):
-    """UnitTest for todo attachments models"""
+@skipUnless(connection.features.has_select_for_update, 'needs row locks')
+class TestConcurrentSort(TransactionTestCase):
+    """Stress test for the sort given to objects created at the same time"""
+
+    def run_concurrently(self, create, threads=8, inserts=10):
+        """runs the create function from many threads at once and returns its errors"""
+
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for i in range(inserts):
+                    create()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for i in range(threads)]
+        for worker_thread in workers:
+            worker_thread.start()
+        for worker_thread in workers:
+            worker_thread.join()
+        return errors
+
+    def test_concurrent_todo_groups(self):
+        """test for todo groups created at the same time for the same user"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+
+        errors = self.run_concurrently(lambda: TodoGroupModel.objects.create(user=user_profile, title='group'))
+        self.assertEqual(errors, [])
+        self.assertEqual(list(user_profile.todo_groups.values_list('sort', flat=True)), list(range(1, 81)))
+
+    def test_concurrent_todos(self):
+        """test for todo items created at the same time in the same group"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+        group = TodoGroupModel.objects.create(user=user_profile, title='group')
+
+        errors = self.run_concurrently(lambda: TodoModel.objects.create(category=group, title='todo'))
+        self.assertEqual(errors, [])
+        self.assertEqual(list(group.todos.values_list('sort', flat=True)), list(range(1, 81)))
+
+    def test_concurrent_moves_and_deletes(self):
+        """test for todo items created, moved and deleted at the same time in the same group"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+        group = TodoGroupModel.objects.create(user=user_profile, title='group')
+        for i in range(20):
+            TodoModel.objects.create(category=group, title='todo')
+
+        missing_moves = []
+
+        def change():
+            action = random.choice(('create', 'move', 'delete'))
+            with transaction.atomic():
+                if action == 'create':
+                    TodoModel.objects.create(category=group, title='todo')
+                    return
+                todo = group.todos.order_by('?').first()
+                if todo is None:
+                    return
+                if action == 'delete':
+                    # deletes nothing if another thread deleted it meanwhile
+                    todo.delete()
+                    return
+                try:
+                    move_sort(todo, group.todos.all(), 1)
+                except Http404:
+                    # the view's 404 for a todo deleted by another thread meanwhile
+                    missing_moves.append(todo.pk)
+                    return
+                todo.save()
+
+        errors = self.run_concurrently(change)
+        self.assertEqual(errors, [])
+        self.assertFalse(group.todos.filter(pk__in=missing_moves).exists())
+        sorts = list(group.todos.values_list('sort', flat=True))
+        self.assertEqual(sorts, list(range(1, len(sorts) + 1)))
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class TestTodoAttachment(TemporaryMediaMixin, TransactionTestCase):
+    """UnitTest for todo attachments models,
+    the files are removed only after the deletions are committed"""
 
     def setUp(self):
         """Setup for unittest"""
-        with open("media/sample.flv", "w+"):
+        with open(os.path.join(settings.MEDIA_ROOT, "sample.flv"), "w+"):
             pass
 
     def test_todo_attachment_sort_unique(self):
@@ -141,6 +319,55 @@ class TestTodoAttachment(TestCase):
         attachment = TodoAttachmentModel.objects.create(todo_item=todo, file='sample.flv')
         self.assertTrue(os.path.isfile(attachment.file.path))
 
+        # kept if the deletion is rolled back
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            TodoAttachmentModel.objects.get(pk=attachment.pk).delete()
+            raise RuntimeError
+        self.assertTrue(os.path.isfile(attachment.file.path))
+
         attachment.delete()
 
         self.assertFalse(os.path.isfile(attachment.file.path))
+
+    def test_file_deduplication(self):
+        """test for todo attachments with the same content sharing one blob"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+
+        group = TodoGroupModel.objects.create(user=user_profile, title='group1')
+        todo = TodoModel.objects.create(category=group, title='todo1')
+
+        attachment1 = TodoAttachmentModel.objects.create(
+            todo_item=todo, file=SimpleUploadedFile(name='file1.txt', content=b'content'))
+        attachment2 = TodoAttachmentModel.objects.create(
+            todo_item=todo, file=SimpleUploadedFile(name='file2.txt', content=b'content'))
+        attachment3 = TodoAttachmentModel.objects.create(
+            todo_item=todo, file=SimpleUploadedFile(name='file3.txt', content=b'other content'))
+
+        self.assertEqual(attachment1.blob_id, attachment2.blob_id)
+        self.assertEqual(attachment1.file.name, attachment2.file.name)
+        self.assertNotEqual(attachment1.blob_id, attachment3.blob_id)
+        blob = AttachmentBlobModel.objects.get(pk=attachment1.blob_id)
+        self.assertEqual(blob.references, 2)
+        self.assertEqual(blob.size, len(b'content'))
+
+        # the blob is kept until its last attachment is deleted
+        attachment1.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.references, 1)
+        self.assertTrue(os.path.isfile(blob.file.path))
+
+        attachment2.delete()
+        self.assertFalse(AttachmentBlobModel.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.isfile(blob.file.path))
+
+        attachment3.delete()
+        self.assertFalse(AttachmentBlobModel.objects.exists())
+
+    def test_remove_no_files(self):
+        """test for removing no files not waiting for the commit"""
+
+        with transaction.atomic():
+            remove_files_after_commit()
+            self.assertEqual(connection.run_on_commit, [])
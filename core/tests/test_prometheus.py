@@ -0,0 +1,112 @@
+import os
+import re
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import UserProfileModel
+from core.prometheus import Registry, Counter, Histogram
+
+
+def sample(text, name):
+    """Gives the value of a sample in an export, 0 if it's not there"""
+
+    match = re.search(r'^{0} (\S+)$'.format(re.escape(name)), text, re.MULTILINE)
+    return float(match.group(1)) if match else 0
+
+
+class TestRegistry(TestCase):
+    """Unit Test for the metrics registry"""
+
+    def setUp(self):
+        """setup for unittest"""
+        self.registry = Registry()
+        self.counter = Counter(self.registry, 'test_events', 'Events.', ('kind',))
+        self.histogram = Histogram(self.registry, 'test_duration_seconds', 'Durations.', buckets=(0.1, 1))
+
+    def test_export(self):
+        """Test for the metrics exported in the text format"""
+
+        self.counter.inc(kind='a "quoted" kind')
+        self.counter.inc(2, kind='a "quoted" kind')
+        self.histogram.observe(0.05)
+        self.histogram.observe(0.5)
+        self.histogram.observe(5)
+        text = self.registry.export()
+
+        self.assertIn('# TYPE test_events_total counter\n', text)
+        self.assertEqual(sample(text, r'test_events_total{kind="a \"quoted\" kind"}'), 3)
+        self.assertIn('# TYPE test_duration_seconds histogram\n', text)
+        self.assertEqual(sample(text, 'test_duration_seconds_bucket{le="0.1"}'), 1)
+        self.assertEqual(sample(text, 'test_duration_seconds_bucket{le="1.0"}'), 2)
+        self.assertEqual(sample(text, 'test_duration_seconds_bucket{le="+Inf"}'), 3)
+        self.assertEqual(sample(text, 'test_duration_seconds_count'), 3)
+        self.assertEqual(sample(text, 'test_duration_seconds_sum'), 5.55)
+
+        with self.assertRaises(ValueError):
+            self.counter.inc(other='label')
+
+    def test_processes(self):
+        """Test that the metrics of all the processes sharing a directory are exported"""
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS_DIR=directory):
+            self.counter.inc(kind='a')
+            self.histogram.observe(0.5)
+            self.registry.flush(force=True)
+            first_process = self.registry.path
+
+            # a forked worker starts without its parent's counts in its own file
+            self.registry.pid = -1
+            self.counter.inc(5, kind='a')
+            self.counter.inc(kind='b')
+            self.histogram.observe(0.05)
+            text = self.registry.export()
+
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertNotEqual(self.registry.path, first_process)
+            self.assertEqual(sample(text, 'test_events_total{kind="a"}'), 6)
+            self.assertEqual(sample(text, 'test_events_total{kind="b"}'), 1)
+            self.assertEqual(sample(text, 'test_duration_seconds_bucket{le="0.1"}'), 1)
+            self.assertEqual(sample(text, 'test_duration_seconds_count'), 2)
+
+            # the files that can't be read are skipped
+            with open(os.path.join(directory, 'broken.json'), 'w') as file:
+                file.write('{')
+            self.assertEqual(sample(self.registry.export(), 'test_events_total{kind="a"}'), 6)
+
+
+class TestMetricsView(TestCase):
+    """Unit Test for the metrics view"""
+
+    def test_metrics(self):
+        """Test for the metrics of the requests exported by the metrics view"""
+
+        account = User.objects.create_user(username='username', password='password')
+        UserProfileModel.objects.create(account=account)
+        self.client.force_login(account)
+        url = reverse('core:metrics')
+        requests = 'todo_http_requests_total{view="TodoView.list",method="GET",status="200"}'
+        queries = 'todo_db_queries_per_request_count{view="TodoView.list"}'
+
+        text = self.client.get(url).content.decode()
+        self.client.get(reverse('core:todo-list', kwargs={'username': 'username'}))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertEqual(sample(response.content.decode(), requests), sample(text, requests) + 1)
+        self.assertEqual(sample(response.content.decode(), queries), sample(text, queries) + 1)
+        self.assertIn('todo_http_request_duration_seconds_bucket{view="TodoView.list",le="+Inf"}',
+                      response.content.decode())
+
+        # only the scrapers with the token when it's set
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url).status_code, 401)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+        self.assertEqual(self.client.post(url).status_code, 405)
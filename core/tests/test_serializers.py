@@ -1,14 +1,23 @@
 import os
 
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.core.files import File
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
 
+from core.cache import get_user_version
 from core.models import TodoGroupModel, UserProfileModel, TodoModel
-from core.serializers import UserSerializer, TodoGroupSerializer, TodoItemSerializer, TodoAttachmentSerializer
+from core.serializers import UserSerializer, UserProfileSerializer, TodoGroupSerializer, TodoItemSerializer, \
+    TodoAttachmentSerializer
+from core.signals import make_photo_derivatives
+from core.tests.media import TemporaryMediaMixin
 
 
-class TestUsers(TestCase):
+class TestUsers(TemporaryMediaMixin, TestCase):
     """UnitTest for users serializers"""
 
     def test_name_fields_required(self):
@@ -57,6 +66,53 @@ class TestUsers(TestCase):
                                           'last_name': 'last', 'password': '123456789'})
         self.assertFalse(serializer.is_valid())
 
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_profile_photo_derivatives(self):
+        """test for the resized copies of the profile photo"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user)
+        self.assertIsNone(UserProfileSerializer(user_profile).data['profile_photo_derivatives'])
+
+        photo = open(settings.BASE_DIR + '/core/tests/sample.jpg', 'rb').read()
+        user_profile.profile_photo = SimpleUploadedFile(name='photo.jpg', content=photo)
+        user_profile.save()
+
+        # only given once the background task made them, the task scheduled after
+        # the commit doesn't run in tests so the first read makes them instead
+        version = get_user_version(user_profile.pk)
+        self.assertEqual(UserProfileSerializer(user_profile).data['profile_photo_derivatives'], {})
+        self.assertNotEqual(get_user_version(user_profile.pk), version)  # the ETags without them don't match
+
+        # the version is kept when there is nothing new to make
+        version = get_user_version(user_profile.pk)
+        make_photo_derivatives(user_profile.pk, user_profile.profile_photo.name, user_profile.profile_photo.storage)
+        self.assertEqual(get_user_version(user_profile.pk), version)
+
+        derivatives = UserProfileSerializer(user_profile).data['profile_photo_derivatives']
+        self.assertEqual(set(derivatives), {'small', 'medium'})
+        storage = user_profile.profile_photo.storage
+        for size, limit in (('small', 64), ('medium', 256)):
+            self.assertEqual(set(derivatives[size]), {'webp', 'jpeg'})
+            for url in derivatives[size].values():
+                path = os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+                with Image.open(path) as image:
+                    self.assertLessEqual(max(image.size), limit)
+                os.remove(path)
+        os.remove(user_profile.profile_photo.path)
+
+    def test_missing_profile_photo(self):
+        """test for the resized copies of a profile photo whose file is missing"""
+
+        user = User.objects.create_user(username='username', password='password')
+        user_profile = UserProfileModel.objects.create(account=user, profile_photo='users/missing.jpg')
+
+        version = get_user_version(user_profile.pk)
+        with self.assertLogs('core.images', 'ERROR'):
+            make_photo_derivatives(user_profile.pk, user_profile.profile_photo.name, user_profile.profile_photo.storage)
+        self.assertEqual(get_user_version(user_profile.pk), version)
+        self.assertEqual(UserProfileSerializer(user_profile).data['profile_photo_derivatives'], {})
+
 
 class TestTodoGroup(TestCase):
     """Unittest for todo group serializer"""
@@ -166,6 +222,59 @@ class TestTodo(TestCase):
         self.assertEqual(todo.sort, 1)
         self.assertEqual(another_todo.sort, 2)
 
+    def test_reorder_query_count(self):
+        """test that moving a todo costs the same queries whatever the list length is"""
+
+        def move_queries(length):
+            self.group.todos.all().delete()
+            todos = [TodoModel.objects.create(title=str(i), category=self.group) for i in range(length)]
+
+            serializer = TodoItemSerializer(todos[0], data={'title': 'title', 'sort': length})
+            self.assertTrue(serializer.is_valid())
+            with CaptureQueriesContext(connection) as context:
+                serializer.save()
+
+            # the first todo is moved to the end and the rest are shifted up
+            self.assertEqual(list(self.group.todos.values_list('title', flat=True)),
+                             [str(i) for i in range(1, length)] + ['title'])
+            self.assertEqual(list(self.group.todos.values_list('sort', flat=True)),
+                             list(range(1, length + 1)))
+            return len(context.captured_queries)
+
+        self.assertEqual(move_queries(10), move_queries(200))
+
+    @override_settings(SORT_MODE='gap')
+    def test_gap_sorts(self):
+        """test for moving todos in the gap sort mode"""
+
+        todos = [TodoModel.objects.create(title=str(i), category=self.group) for i in range(5)]
+        self.assertEqual([todo.sort for todo in todos], [1024, 2048, 3072, 4096, 5120])
+
+        # only the moved todo is written
+        serializer = TodoItemSerializer(todos[4], data={'title': '4', 'sort': 2})
+        self.assertTrue(serializer.is_valid())
+        with CaptureQueriesContext(connection) as context:
+            serializer.save()
+        self.assertEqual(len([query for query in context.captured_queries
+                              if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(serializer.data['sort'], 2)
+        self.assertEqual(list(self.group.todos.values_list('title', 'sort')),
+                         [('0', 1024), ('4', 1536), ('1', 2048), ('2', 3072), ('3', 4096)])
+
+        # the sorts are spread again when there's no gap left
+        self.group.todos.filter(title='0').update(sort=1)
+        self.group.todos.filter(title='4').update(sort=2)
+        serializer = TodoItemSerializer(TodoModel.objects.get(title='3'), data={'title': '3', 'sort': 2})
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(list(self.group.todos.values_list('title', 'sort')),
+                         [('0', 1024), ('3', 2048), ('4', 3072), ('1', 4096), ('2', 5120)])
+
+        # the positions are shown as the sorts
+        data = TodoGroupSerializer(self.group).data
+        self.assertEqual([(todo['title'], todo['sort']) for todo in data['todos']],
+                         [('0', 1), ('3', 2), ('4', 3), ('1', 4), ('2', 5)])
+
     def test_status_type(self):
         """test for status type validation"""
 
@@ -182,19 +291,19 @@ class TestTodo(TestCase):
         self.assertFalse(serializer.is_valid())
 
 
-class TestAttachment(TestCase):
+class TestAttachment(TemporaryMediaMixin, TestCase):
     """Unittest for todo attachment"""
 
     def setUp(self):
         """setup for unittest"""
 
         # makes dummy file to test
-        with open('media/sample.flv', 'w+') as f:
+        with open(os.path.join(settings.MEDIA_ROOT, 'sample.flv'), 'w+') as f:
             # 1 mb file
             f.write('a' * 10 ** 6)
             self.file = File(f)
 
-        with open('media/sample2.flv', 'w+') as f:
+        with open(os.path.join(settings.MEDIA_ROOT, 'sample2.flv'), 'w+') as f:
             # 7 mb file
             f.write('a' * 7 * 10 ** 6)
             self.file2 = File(f)
@@ -1,7 +1,8 @@
 from django.test import TestCase
 from django.urls import reverse, resolve
 
-from core.views import UserProfileView, user_login, user_logout, TodoGroupView, TodoView, TodoAttachmentView
+from core.views import UserProfileView, user_login, user_logout, TodoGroupView, TodoView, TodoAttachmentView, \
+    BatchView
 
 
 class TestUsers(TestCase):
@@ -84,3 +85,13 @@ class TestTodoAttachments(TestCase):
                                                               'item_sort': 1, 'pk': 1})
         self.assertEqual(resolve(url).func.__name__,
                          TodoAttachmentView.as_view({'get': 'retrieve'}).__name__)
+
+
+class TestBatch(TestCase):
+    """Test for the users batch urls"""
+
+    def test_batch(self):
+        """test for users batch url"""
+        url = reverse('core:batch', kwargs={'username': 'username'})
+        self.assertEqual(resolve(url).func.__name__,
+                         BatchView.as_view({'post': 'create'}).__name__)
@@ -1,12 +1,18 @@
 import json
+import os
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel
+from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel, ATTACHMENT_MAX_SIZE, \
+    ATTACHMENT_TOO_LARGE
+from core.search import trigram_installed
+from core.tests.media import TemporaryMediaMixin
 
 
 class TestUsers(TestCase):
@@ -120,6 +126,48 @@ class TestUsers(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_get_user_etag(self):
+        """Test for users get view conditional requests"""
+
+        user = User.objects.create_user(username='username', password='password')
+        UserProfileModel.objects.create(account=user)
+        url = reverse('core:user-details', kwargs={'username': 'username'})
+
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        # not changed
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        # the browsable API's page of the same url is another representation
+        response = self.client.get(url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Accept', response['Vary'])
+
+        # changed
+        user.first_name = 'first'
+        user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # updating with an old ETag
+        self.client.force_login(user)
+        response = self.client.patch(url, {'account': {'first_name': 'name'}},
+                                     content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+
+        # updating with the current ETag
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(url, {'account': {'first_name': 'name'}},
+                                     content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
     def test_update_user(self):
         """Test for users update view"""
 
@@ -282,6 +330,19 @@ class TestTodoGroup(TestCase):
         response = self.client.put(url, {'title': 'title'},
                                    content_type='application/json')
         self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # updating with the current ETag
+        response = self.client.put(url, {'title': 'new title'},
+                                   content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # updating with the old ETag
+        response = self.client.put(url, {'title': 'old title'},
+                                   content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(TodoGroupModel.objects.get().title, 'new title')
 
         # wrong data for put
         response = self.client.put(url, {},  # missing attrs
@@ -342,7 +403,7 @@ class TestTodoGroup(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
-class TestTodoItem(TestCase):
+class TestTodoItem(TemporaryMediaMixin, TestCase):
     """Unit Test for todo item views"""
 
     def setUp(self):
@@ -384,6 +445,232 @@ class TestTodoItem(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_list_query_count(self):
+        """Test that the todo items list view runs a constant number of queries"""
+
+        url = reverse('core:todo-list', kwargs={'username': 'username'})
+        self.client.force_login(self.account)
+
+        def list_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, {'limit': 100})
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        todo = TodoModel.objects.create(category=self.group, title='title')
+        TodoAttachmentModel.objects.create(todo_item=todo, file='sample.flv')
+        queries = list_queries()
+
+        # a lot more groups, todos and attachments
+        for i in range(10):
+            group = TodoGroupModel.objects.create(user=self.group.user, title='title')
+            for j in range(5):
+                todo = TodoModel.objects.create(category=group, title='title')
+                TodoAttachmentModel.objects.create(todo_item=todo, file='sample.flv')
+                TodoAttachmentModel.objects.create(todo_item=todo, file='sample.flv')
+
+        self.assertEqual(list_queries(), queries)
+
+    def test_list_cache(self):
+        """Test that the todo items list is cached until the user's todos change"""
+
+        todo = TodoModel.objects.create(category=self.group, title='title')
+        url = reverse('core:todo-list', kwargs={'username': 'username'})
+        self.client.force_login(self.account)
+
+        def list_todos():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            titles = [todo['title'] for group in json.loads(response.content)['todo_groups']
+                      for todo in group['todos']]
+            return titles, context.captured_queries
+
+        titles, queries = list_todos()
+        self.assertEqual(titles, ['title'])
+
+        # served from the cache without querying the todos
+        titles, cached_queries = list_todos()
+        self.assertEqual(titles, ['title'])
+        self.assertLess(len(cached_queries), len(queries))
+        self.assertFalse(any('core_todomodel' in query['sql'] for query in cached_queries))
+
+        # updated from the views
+        response = self.client.patch(reverse('core:todo-detail', kwargs={'username': 'username',
+                                                                         'group_sort': 1, 'pk': 1}),
+                                     {'title': 'updated'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list_todos()[0], ['updated'])
+
+        # bulk created
+        response = self.client.post(reverse('core:todo-create', kwargs={'username': 'username', 'group_sort': 1}),
+                                    [{'title': 'bulk'}], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list_todos()[0], ['updated', 'bulk'])
+
+        # deleted from the models
+        todo.delete()
+        self.assertEqual(list_todos()[0], ['bulk'])
+
+    def test_list_etag(self):
+        """Test for todo items list view conditional requests"""
+
+        url = reverse('core:todo-list', kwargs={'username': 'username'})
+        self.client.force_login(self.account)
+        etag = self.client.get(url)['ETag']
+
+        # not changed
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # another page
+        response = self.client.get(url, {'offset': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # changed
+        TodoModel.objects.create(category=self.group, title='title')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # another user can't use the ETag
+        user2 = User.objects.create_user(username='username2', password='password')
+        UserProfileModel.objects.create(account=user2)
+        self.client.force_login(user2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_cursor_pagination(self):
+        """Test for todo items list view paginated with a cursor"""
+
+        for i in range(24):
+            TodoGroupModel.objects.create(user=self.group.user, title='title')
+        url = reverse('core:todo-list', kwargs={'username': 'username'})
+        self.client.force_login(self.account)
+
+        # the default pagination is still limit and offset
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.content)['count'], 25)
+
+        sorts = []
+        next_url = url + '?pagination=cursor&limit=10'
+        while next_url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(next_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('COUNT' in query['sql'] for query in context.captured_queries))
+
+            data = json.loads(response.content)
+            self.assertNotIn('count', data)
+            sorts += [group['sort'] for group in data['todo_groups']]
+            next_url = data['next']
+
+        self.assertEqual(sorts, list(range(1, 26)))
+
+        # going back from the last page
+        response = self.client.get(data['previous'])
+        self.assertEqual([group['sort'] for group in json.loads(response.content)['todo_groups']],
+                         list(range(11, 21)))
+
+    def test_list_filters(self):
+        """Test for todo items list view filtered by status and group with picked fields"""
+
+        TodoModel.objects.create(category=self.group, title='first')
+        todo = TodoModel.objects.create(category=self.group, title='second', status='C')
+        TodoAttachmentModel.objects.create(todo_item=todo, file='sample.flv')
+        group = TodoGroupModel.objects.create(user=self.group.user, title='title')
+        TodoModel.objects.create(category=group, title='third', status='C')
+        url = reverse('core:todo-list', kwargs={'username': 'username'})
+        self.client.force_login(self.account)
+
+        def list_todos(query):
+            response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 200)
+            return [[dict(todo) for todo in group['todos']] for group in response.data['todo_groups']]
+
+        self.assertEqual([[todo['title'] for todo in todos] for todos in list_todos({'status': 'C'})],
+                         [['second'], ['third']])
+        self.assertEqual(list_todos({'status': 'C', 'group': 1})[0][0]['sort'], 2)
+        self.assertEqual(list_todos({'group': 2, 'fields': 'title'}), [[{'sort': 1, 'title': 'third'}]])
+
+        # the attachments aren't queried when they aren't asked for
+        with CaptureQueriesContext(connection) as context:
+            list_todos({'fields': 'title,status'})
+        self.assertFalse(any('core_todoattachmentmodel' in query['sql'] for query in context.captured_queries))
+        self.assertFalse(any('description' in query['sql'] for query in context.captured_queries))
+
+        # not valid
+        for query in ({'status': 'X'}, {'group': 0}, {'fields': 'title,owner'}):
+            response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 400)
+
+    def test_list_summary(self):
+        """Test for todo items list view giving the counts of the groups' todos"""
+
+        TodoModel.objects.create(category=self.group, title='first')
+        TodoModel.objects.create(category=self.group, title='second', status='C')
+        TodoGroupModel.objects.create(user=self.group.user, title='empty')
+        url = reverse('core:todo-list', kwargs={'username': 'username'})
+        self.client.force_login(self.account)
+
+        response = self.client.get(url, {'summary': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dict(group) for group in response.data['todo_groups']],
+                         [{'sort': 1, 'title': 'title', 'todos_count': 2, 'checked_count': 1},
+                          {'sort': 2, 'title': 'empty', 'todos_count': 0, 'checked_count': 0}])
+
+        response = self.client.get(url, {'summary': 'true', 'status': 'U', 'pagination': 'cursor'})
+        self.assertEqual(response.data['todo_groups'][0]['todos_count'], 1)
+
+    def test_group_list(self):
+        """Test for the todo items list view of a single todo group"""
+
+        for i in range(25):
+            TodoModel.objects.create(category=self.group, title='title {0}'.format(i), status='UC'[i % 2])
+        url = reverse('core:todo-create', kwargs={'username': 'username', 'group_sort': 1})
+
+        # not logged
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        # not logged in as that user
+        user2 = User.objects.create_user(username='username2', password='password')
+        UserProfileModel.objects.create(account=user2)
+        self.client.force_login(user2)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        # right, paginated by limit and offset
+        self.client.force_login(self.account)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['count'], len(response.data['todos'])), (25, 20))
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+        response = self.client.get(url, {'offset': 10, 'status': 'C', 'fields': 'title'})
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual([dict(todo) for todo in response.data['todos']],
+                         [{'sort': 2 * i + 2, 'title': 'title {0}'.format(2 * i + 1)} for i in range(10, 12)])
+
+        # paginated by a cursor
+        sorts = []
+        next_url = url + '?pagination=cursor&limit=10'
+        while next_url:
+            response = self.client.get(next_url)
+            sorts += [todo['sort'] for todo in response.data['todos']]
+            next_url = response.data['next']
+        self.assertEqual(sorts, list(range(1, 26)))
+
+        # not valid
+        self.assertEqual(self.client.get(url, {'status': 'X'}).status_code, 400)
+
+        # wrong group
+        url = reverse('core:todo-create', kwargs={'username': 'username', 'group_sort': 123})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
     def test_get(self):
         """Test for todo item get view"""
 
@@ -423,6 +710,41 @@ class TestTodoItem(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_get_query_count(self):
+        """Test that the permissions of todo item get view don't query the todo's owners"""
+
+        TodoModel.objects.create(category=self.group, title='title')
+        url = reverse('core:todo-detail', kwargs={'username': 'username', 'group_sort': 1, 'pk': 1})
+        self.client.force_login(self.account)
+
+        # the session, the user with its profile, the todo with its group and its attachments
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_etag(self):
+        """Test for todo item get and update views conditional requests"""
+
+        TodoModel.objects.create(category=self.group, title='title')
+        url = reverse('core:todo-detail', kwargs={'username': 'username', 'group_sort': 1, 'pk': 1})
+        self.client.force_login(self.account)
+        etag = self.client.get(url)['ETag']
+
+        # not changed
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # updating with the current ETag
+        response = self.client.patch(url, {'status': 'C'}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # updating with the old ETag
+        response = self.client.put(url, {'title': 'title'}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(json.loads(self.client.get(url).content)['status'], 'C')
+
     def test_create(self):
         """Test for todo item create view"""
 
@@ -460,6 +782,155 @@ class TestTodoItem(TestCase):
                                     content_type='application/json')
         self.assertEqual(response.status_code, 404)
 
+    def test_search(self):
+        """Test for todo items search view"""
+
+        TodoModel.objects.create(category=self.group, title='buy groceries', description='milk and eggs')
+        TodoModel.objects.create(category=self.group, title='call mom', description='about the groceries')
+        TodoModel.objects.create(category=self.group, title='write report')
+        url = reverse('core:todo-search', kwargs={'username': 'username'})
+
+        # not logged
+        response = self.client.get(url, {'q': 'groceries'})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.account)
+
+        # missing text
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 400)
+
+        # the todo with the word in its title ranks first
+        response = self.client.get(url, {'q': 'grocery'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([(todo['group_sort'], todo['sort'], todo['title']) for todo in response.data['results']],
+                         [(1, 1, 'buy groceries'), (1, 2, 'call mom')])
+
+        response = self.client.get(url, {'q': 'groceries', 'limit': 1, 'offset': 1})
+        self.assertEqual([todo['title'] for todo in response.data['results']], ['call mom'])
+
+        response = self.client.get(url, {'q': 'nothing'})
+        self.assertEqual(response.data['count'], 0)
+
+        # wrong username
+        url = reverse('core:todo-search', kwargs={'username': 'wrong'})
+        response = self.client.get(url, {'q': 'groceries'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_fuzzy_search(self):
+        """Test for todo items search view matching misspelled titles"""
+
+        if not trigram_installed():
+            self.skipTest('needs the pg_trgm extension')
+        TodoModel.objects.create(category=self.group, title='buy groceries')
+        TodoModel.objects.create(category=self.group, title='write report')
+        url = reverse('core:todo-search', kwargs={'username': 'username'})
+        self.client.force_login(self.account)
+
+        response = self.client.get(url, {'q': 'grocerys'})
+        self.assertEqual([todo['title'] for todo in response.data['results']], ['buy groceries'])
+
+    @override_settings(SORT_MODE='gap')
+    def test_search_gap_sorts(self):
+        """Test for the positions of the found todo items and their groups in the gap sort mode,
+        they are numbered in a fixed number of queries"""
+
+        self.client.force_login(self.account)
+        url = reverse('core:todo-search', kwargs={'username': 'username'})
+        group2 = TodoGroupModel.objects.create(user=self.group.user, title='title')
+        TodoModel.objects.create(category=group2, title='write report')
+
+        def search_queries(count):
+            for i in range(count):
+                TodoModel.objects.create(category=self.group, title='buy groceries')
+                TodoModel.objects.create(category=group2, title='buy groceries')
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'q': 'groceries', 'limit': 100})
+            return response, len(queries)
+
+        response, queries = search_queries(1)
+        self.assertEqual(sorted((todo['group_sort'], todo['sort']) for todo in response.data['results']),
+                         [(1, 1), (2, 2)])
+        response, more_queries = search_queries(5)
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(queries, more_queries)
+
+    @override_settings(SORT_MODE='gap')
+    def test_gap_sorts(self):
+        """Test for todo items looked up and shown by their positions in the gap sort mode"""
+
+        self.client.force_login(self.account)
+        for title in ('first', 'second', 'third'):
+            TodoModel.objects.create(category=self.group, title=title)
+
+        def detail_url(sort):
+            return reverse('core:todo-detail', kwargs={'username': 'username', 'group_sort': 1, 'pk': sort})
+
+        # deleting doesn't resort the other todos but their positions change
+        response = self.client.delete(detail_url(1))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(self.group.todos.values_list('sort', flat=True)), [2048, 3072])
+
+        response = self.client.get(detail_url(1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['title'], response.data['sort']), ('second', 1))
+        self.assertEqual(self.client.get(detail_url(3)).status_code, 404)
+
+        response = self.client.patch(detail_url(2), {'sort': 1}, content_type='application/json')
+        self.assertEqual((response.data['title'], response.data['sort']), ('third', 1))
+
+        response = self.client.get(reverse('core:todo-list', kwargs={'username': 'username'}))
+        todos = response.data['todo_groups'][0]['todos']
+        self.assertEqual([(todo['title'], todo['sort']) for todo in todos], [('third', 1), ('second', 2)])
+
+        # the filtered todos keep their positions in their group
+        self.group.todos.filter(title='second').update(status='C')
+        response = self.client.get(reverse('core:todo-list', kwargs={'username': 'username'}), {'status': 'C'})
+        todos = response.data['todo_groups'][0]['todos']
+        self.assertEqual([(todo['title'], todo['sort']) for todo in todos], [('second', 2)])
+
+        response = self.client.get(reverse('core:todo-create', kwargs={'username': 'username', 'group_sort': 1}),
+                                   {'offset': 1})
+        self.assertEqual([(todo['title'], todo['sort']) for todo in response.data['todos']], [('second', 2)])
+        response = self.client.get(reverse('core:todo-create', kwargs={'username': 'username', 'group_sort': 1}),
+                                   {'status': 'C'})
+        self.assertEqual([(todo['title'], todo['sort']) for todo in response.data['todos']], [('second', 2)])
+
+    def test_bulk_create(self):
+        """Test for creating many todo items at once"""
+
+        TodoModel.objects.create(category=self.group, title='title')
+        url = reverse('core:todo-create', kwargs={'username': 'username', 'group_sort': 1})
+        self.client.force_login(self.account)
+
+        # right and sorted after the existing todo
+        response = self.client.post(url, [{'title': 'title'}, {'title': 'title', 'status': 'C'}],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([todo['sort'] for todo in json.loads(response.content)], [2, 3])
+
+        # wrong data, each todo gets its own errors and none is created
+        response = self.client.post(url, [{'title': 'title'}, {'status': 'wrong'}],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = json.loads(response.content)
+        self.assertEqual(errors[0], {})
+        self.assertIn('title', errors[1])
+        self.assertIn('status', errors[1])
+        self.assertEqual(self.group.todos.count(), 3)
+
+        # the queries don't depend on how many todos are sent
+        def create_queries(count):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(url, [{'title': 'title'}] * count,
+                                            content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            return len(context.captured_queries)
+
+        self.assertEqual(create_queries(10), create_queries(500))
+        self.assertEqual(list(self.group.todos.values_list('sort', flat=True)), list(range(1, 514)))
+
         # wrong group sort
         url = reverse('core:todo-create', kwargs={'username': 'username', 'group_sort': 123})
         response = self.client.post(url, {'title': 'title'},
@@ -579,8 +1050,10 @@ class TestTodoItem(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
-class TestTodoAttachment(TestCase):
-    """Unit Test for todo attachment views"""
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class TestTodoAttachment(TemporaryMediaMixin, TransactionTestCase):
+    """Unit Test for todo attachment views,
+    the files are removed only after the deletions are committed"""
 
     def setUp(self):
         """set up for unittest"""
@@ -625,6 +1098,10 @@ class TestTodoAttachment(TestCase):
         response = self.client.post(url, {'file': self.img_upload()})
         self.assertEqual(response.status_code, 201)
         self.assertEqual(json.loads(response.content)['sort'], 1)  # check for sort from signals
+        # the file is sent by the download action checking the permissions
+        self.assertEqual(json.loads(response.content)['file'], reverse(
+            'core:todo_attachments-download', kwargs={'username': 'username', 'group_sort': 1,
+                                                      'item_sort': 1, 'pk': 1}))
 
         # wrong data
         response = self.client.post(url, {})  # missing attrs
@@ -638,6 +1115,107 @@ class TestTodoAttachment(TestCase):
 
         self.delete_test_files()
 
+    def test_create_too_large(self):
+        """test for todo attachment create view with files over the size limit"""
+
+        url = reverse('core:todo_attachments-list', kwargs={'username': 'username',
+                                                            'group_sort': 1, 'item_sort': 1})
+        directory = TodoAttachmentModel.file.field.storage.path('attachments')
+        os.makedirs(directory, exist_ok=True)
+        files = set(os.listdir(directory))
+        self.client.force_login(self.account)
+
+        # stopped while streaming, and rejected before reading the request
+        for size in (ATTACHMENT_MAX_SIZE + 1, ATTACHMENT_MAX_SIZE * 2):
+            file = SimpleUploadedFile(name='large.bin', content=b'0' * size)
+            response = self.client.post(url, {'file': file})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(json.loads(response.content), {'file': [ATTACHMENT_TOO_LARGE]})
+
+        self.assertFalse(self.todo.attachments.exists())
+        self.assertEqual(set(os.listdir(directory)), files)  # no partial files left
+
+        # right at the limit
+        response = self.client.post(url, {'file': SimpleUploadedFile(name='limit.bin',
+                                                                     content=b'0' * ATTACHMENT_MAX_SIZE)})
+        self.assertEqual(response.status_code, 201)
+        attachment = self.todo.attachments.get()
+        self.assertEqual(attachment.file.size, ATTACHMENT_MAX_SIZE)
+        self.assertEqual(set(os.listdir(directory)), files | {os.path.basename(attachment.file.name)})
+
+        self.delete_test_files()
+
+    def test_download(self):
+        """test for todo attachment download view"""
+
+        attachment = TodoAttachmentModel.objects.create(todo_item=self.todo, file=self.img_upload())
+        content = open(settings.BASE_DIR + '/core/tests/sample.jpg', 'rb').read()
+        url = reverse('core:todo_attachments-download', kwargs={'username': 'username',
+                                                                'group_sort': 1,
+                                                                'item_sort': 1, 'pk': 1})
+
+        # not logged
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        # not logged in as that user
+        user2 = User.objects.create_user(username='username2', password='password')
+        UserProfileModel.objects.create(account=user2)
+        self.client.force_login(user2)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        # right
+        self.client.force_login(self.account)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], '"{0}"'.format(attachment.blob.sha256))
+
+        # not modified
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # ranges
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/{0}'.format(len(content)))
+        self.assertEqual(response['Content-Length'], '10')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), content[-5:])
+
+        response = self.client.get(url, HTTP_RANGE='bytes={0}-'.format(len(content)))
+        self.assertEqual(response.status_code, 416)
+
+        # the file changed since the client's copy, it gets all of it
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+        # offloaded to the front server
+        with self.settings(ATTACHMENT_DOWNLOAD_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + attachment.file.name)
+            self.assertEqual(response.content, b'')
+        with self.settings(ATTACHMENT_DOWNLOAD_OFFLOAD='x-sendfile'):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Sendfile'], attachment.file.path)
+
+        # wrong attachment pk
+        url = reverse('core:todo_attachments-download', kwargs={'username': 'username',
+                                                                'group_sort': 1,
+                                                                'item_sort': 1, 'pk': 123})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+        self.delete_test_files()
+
     def test_delete(self):
         """test for todo attachment delete view"""
 
@@ -683,3 +1261,87 @@ class TestTodoAttachment(TestCase):
         self.assertEqual(response.status_code, 404)
 
         self.delete_test_files()
+
+
+class TestBatch(TestCase):
+    """Unit Test for batch views"""
+
+    def setUp(self):
+        """setup for unittest"""
+        self.account = User.objects.create_user(username='username', password='password')
+        self.user_profile = UserProfileModel.objects.create(account=self.account)
+        self.group = TodoGroupModel.objects.create(user=self.user_profile, title='title')
+        self.todo = TodoModel.objects.create(category=self.group, title='title')
+        self.url = reverse('core:batch', kwargs={'username': 'username'})
+
+    def test_create(self):
+        """Test for batch create view"""
+
+        operations = {'operations': [
+            {'resource': 'todo-group', 'action': 'create', 'data': {'title': 'second group'}},
+            {'resource': 'todo-item', 'action': 'create', 'group_sort': 2, 'data': {'title': 'todo'}},
+            {'resource': 'todo-item', 'action': 'create', 'group_sort': 1, 'data': {'title': 'todo'}},
+            {'resource': 'todo-item', 'action': 'partial_update', 'group_sort': 1, 'sort': 2,
+             'data': {'status': 'C', 'sort': 1}},
+            {'resource': 'todo-group', 'action': 'update', 'sort': 2, 'data': {'title': 'group', 'sort': 1}},
+            {'resource': 'todo-item', 'action': 'destroy', 'group_sort': 2, 'sort': 2},
+        ]}
+
+        # not logged
+        response = self.client.post(self.url, operations, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        # not logged in as that user
+        user2 = User.objects.create_user(username='username2', password='password')
+        UserProfileModel.objects.create(account=user2)
+        self.client.force_login(user2)
+        response = self.client.post(self.url, operations, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        # right
+        self.client.force_login(self.account)
+        response = self.client.post(self.url, operations, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['status'] for result in results], [201, 201, 201, 200, 200, 204])
+        self.assertEqual(results[3]['data']['sort'], 1)
+
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.sort, 2)
+        self.assertEqual(list(self.group.todos.values_list('title', 'status')), [('todo', 'C')])
+        self.assertEqual(self.user_profile.todo_groups.get(sort=1).todos.count(), 1)
+
+        # wrong batch
+        response = self.client.post(self.url, {'operations': [{'resource': 'todo-group', 'action': 'partial_update',
+                                                               'sort': 1}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.url, {'operations': [{'resource': 'todo-item', 'action': 'destroy'}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # wrong username
+        url = reverse('core:batch', kwargs={'username': 'wrong'})
+        response = self.client.post(url, operations, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_rollback(self):
+        """Test that a failing operation rolls back the whole batch"""
+
+        self.client.force_login(self.account)
+        response = self.client.post(self.url, {'operations': [
+            {'resource': 'todo-item', 'action': 'create', 'group_sort': 1, 'data': {'title': 'todo'}},
+            {'resource': 'todo-group', 'action': 'destroy', 'sort': 1},
+            {'resource': 'todo-item', 'action': 'update', 'group_sort': 1, 'sort': 1, 'data': {'title': 'todo'}},
+            {'resource': 'todo-group', 'action': 'create', 'data': {'title': 'group'}},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # the batch stops at the update of the deleted group's todo
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['status'] for result in results], [201, 204, 404])
+
+        self.assertTrue(TodoGroupModel.objects.filter(pk=self.group.pk).exists())
+        self.assertEqual(self.group.todos.count(), 1)
+        self.assertEqual(self.user_profile.todo_groups.count(), 1)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+from core.models import TodoAttachmentModel, ATTACHMENT_MAX_SIZE
+from core.prometheus import ATTACHMENT_UPLOADS, ATTACHMENT_UPLOAD_BYTES
+
+# room left for the multipart boundaries and headers
+# when the request's size is checked before reading it
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class StreamedUploadedFile(UploadedFile):
+    """A file streamed by the AttachmentUploadHandler next to the attachments,
+    the storage moves it to its final name instead of copying it."""
+
+    def __init__(self, file, name, content_type, size, charset, content_type_extra, sha256):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        """Gives the path of the streamed file"""
+        return self.file.name
+
+    def close(self):
+        """Closes the file and deletes it if the storage didn't move it"""
+        self.file.close()
+        if os.path.isfile(self.file.name):
+            os.remove(self.file.name)
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """The upload handler of the todo attachments.
+    Writes the uploaded files' chunks in the attachments' directory as they
+    arrive and hashes them, and stops reading the request as soon as a file
+    is larger than the attachments' size limit."""
+
+    max_size = ATTACHMENT_MAX_SIZE
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = False
+        self.file = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        """Rejects the request without reading it if it's surely too large"""
+        if content_length > self.max_size + MULTIPART_OVERHEAD:
+            self.too_large = True
+            ATTACHMENT_UPLOADS.inc(result='rejected')
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, *args, **kwargs):
+        """Opens a partial file in the attachments' directory for the upload"""
+        super().new_file(*args, **kwargs)
+        directory = TodoAttachmentModel.file.field.storage.path('attachments')
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(os.path.join(directory, '.{0}.part'.format(uuid.uuid4().hex)), 'w+b')
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        """Writes and hashes a chunk of the file, or stops the upload if it's too large"""
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.too_large = True
+            ATTACHMENT_UPLOADS.inc(result='too_large')
+            ATTACHMENT_UPLOAD_BYTES.inc(self.size, result='too_large')
+            self.cleanup()
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+        self.hash.update(raw_data)
+
+    def file_complete(self, file_size):
+        """Gives the streamed file once all of it was written"""
+        self.file.flush()
+        self.file.seek(0)
+        ATTACHMENT_UPLOADS.inc(result='complete')
+        ATTACHMENT_UPLOAD_BYTES.inc(file_size, result='complete')
+        uploaded_file = StreamedUploadedFile(self.file, self.file_name, self.content_type, file_size,
+                                             self.charset, self.content_type_extra, self.hash.hexdigest())
+        self.file = None
+        return uploaded_file
+
+    def cleanup(self):
+        """Deletes the partial file of an upload that didn't complete"""
+        if self.file is not None:
+            self.file.close()
+            if os.path.isfile(self.file.name):
+                os.remove(self.file.name)
+            self.file = None
@@ -1,13 +1,43 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
 from rest_framework import status, viewsets
-from rest_framework.decorators import api_view
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.decorators import action, api_view
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
-from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel
-from core.permissions import UserProfilePermissions, TodoGroupPermissions, TodoPermissions, TodoAttachmentPermissions
-from core.serializers import UserProfileSerializer, TodoGroupSerializer, TodoItemSerializer, TodoAttachmentSerializer
+from core.cache import todo_tree_cache_key, user_etag
+from core.downloads import attachment_response
+from core.models import UserProfileModel, TodoGroupModel, TodoModel, TodoAttachmentModel, ATTACHMENT_TOO_LARGE
+from core.pagination import TodoGroupPagination, TodoGroupCursorPagination, TodoSearchPagination, \
+    TodoItemPagination, TodoItemCursorPagination
+from core.prometheus import REGISTRY
+from core.permissions import UserProfilePermissions, TodoGroupPermissions, TodoPermissions, TodoAttachmentPermissions, \
+    BatchPermissions
+from core.search import search_todos, fuzzy_search_todos
+from core.sorting import at_position, gap_sorts, load_positions
+from core.serializers import UserProfileSerializer, TodoGroupSerializer, TodoItemSerializer, TodoAttachmentSerializer, \
+    BatchSerializer, TodoSearchSerializer, TodoListQuerySerializer, TodoQuerySerializer, TodoGroupSummarySerializer
+from core.uploadhandlers import AttachmentUploadHandler
+
+
+def user_todo_group(username, group_sort):
+    """Gives the queryset of the todo group at a sort in a user's list"""
+
+    return at_position(TodoGroupModel.objects.filter(user__account__username=username), group_sort)
+
+
+def user_todo_item(username, group_sort, item_sort, queryset=TodoModel.objects):
+    """Gives the queryset of the todo item at a sort in a user's todo group"""
+
+    return at_position(queryset.filter(category__in=user_todo_group(username, group_sort)), item_sort)
 
 
 @api_view(['POST'])
@@ -39,6 +69,17 @@ def user_logout(request):
     return Response('Your are not logged in', status=status.HTTP_401_UNAUTHORIZED)
 
 
+@require_GET
+def metrics(request):
+    """View exporting the metrics of all the server's processes in the Prometheus text format,
+    when METRICS_TOKEN is set only the requests with it as their bearer token get them"""
+
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return HttpResponse(status=401)
+    return HttpResponse(REGISTRY.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class UserProfileView(viewsets.ViewSet):
     """View for the user profile.
     Retrieves, creates, Updates and Deletes a User Profile.
@@ -57,11 +98,18 @@ class UserProfileView(viewsets.ViewSet):
             username: the username of the user profile that the user wants info about.
         Returns:
             HTTP 404 Response if user profile is not found,
-            if not, returns HTTP 200 Response with the profile's JSON data.
+            HTTP 304 Response if the profile didn't change since the request's
+            If-None-Match ETag, if not, returns HTTP 200 Response with
+            the profile's JSON data.
         """
         user_profile = get_object_or_404(UserProfileModel, account__username=username)
+        etag = user_etag(user_profile.pk, request)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
         serializer = self.serializer_class(user_profile)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag})
 
     def create(self, request):
         """Creates A new user profile and Logs it In.
@@ -99,17 +147,22 @@ class UserProfileView(viewsets.ViewSet):
              HTTP 400 Response if the data is not
              valid with the errors,
              HTTP 403 Response if the user is not
-             authorized to update that profile
+             authorized to update that profile,
+             HTTP 412 Response if the profile changed since
+             the request's If-Match ETag,
              if not returns HTTP 200 Response with the update JSON data.
         """
 
         user_profile = get_object_or_404(UserProfileModel, account__username=username)
         self.check_object_permissions(request, user_profile)
+        response = get_conditional_response(request, etag=user_etag(user_profile.pk, request))
+        if response is not None:
+            return response
         serializer = self.serializer_class(user_profile, data=request.data)
         if serializer.is_valid():
             serializer.save()
             update_session_auth_hash(request, user_profile.account)
-            return Response(serializer.data)
+            return Response(serializer.data, headers={'ETag': user_etag(user_profile.pk, request)})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def partial_update(self, request, username=None):
@@ -123,16 +176,21 @@ class UserProfileView(viewsets.ViewSet):
              HTTP 400 Response if the data is not valid with the errors,
              HTTP 403 Response if the user is not
              authorized to update that profile,
+             HTTP 412 Response if the profile changed since
+             the request's If-Match ETag,
              if not returns HTTP 200 Response with the update JSON data.
         """
 
         user_profile = get_object_or_404(UserProfileModel, account__username=username)
         self.check_object_permissions(request, user_profile)
+        response = get_conditional_response(request, etag=user_etag(user_profile.pk, request))
+        if response is not None:
+            return response
         serializer = self.serializer_class(user_profile, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             update_session_auth_hash(request, user_profile.account)
-            return Response(serializer.data)
+            return Response(serializer.data, headers={'ETag': user_etag(user_profile.pk, request)})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, username=None):
@@ -197,15 +255,20 @@ class TodoGroupView(viewsets.ViewSet):
             HTTP 403 Response if the user is
             not authorized to update that todo group,
             HTTP 400 Response if the data is not valid with the errors,
-            HTTP 404 Response if the todo group is not found
+            HTTP 404 Response if the todo group is not found,
+            HTTP 412 Response if the todo group changed since
+            the request's If-Match ETag,
             if not returns HTTP 200 Response with the update JSON data.
         """
-        todo_group = get_object_or_404(TodoGroupModel, sort=pk, user__account__username=username)
+        todo_group = get_object_or_404(user_todo_group(username, pk).select_related('user__account'))
         self.check_object_permissions(request, todo_group)
+        response = get_conditional_response(request, etag=user_etag(todo_group.user_id, request))
+        if response is not None:
+            return response
         serializer = self.serializer_class(todo_group, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(serializer.data, headers={'ETag': user_etag(todo_group.user_id, request)})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, username=None, pk=None):
@@ -223,7 +286,7 @@ class TodoGroupView(viewsets.ViewSet):
             not authorized to delete that todo group,
             if not, returns HTTP 204 Response with no content.
         """
-        todo_group = get_object_or_404(TodoGroupModel, sort=pk, user__account__username=username)
+        todo_group = get_object_or_404(user_todo_group(username, pk))
         self.check_object_permissions(request, todo_group)
         todo_group.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -239,6 +302,12 @@ class TodoView(viewsets.ViewSet):
 
     def list(self, request, username=None):
         """Lists all todo items the user has.
+        The todo groups are paginated by limit and offset, or by a cursor
+        when the request's pagination query parameter is "cursor",
+        the todos can be filtered by their "status" and "group" sort
+        and their "fields" picked with query parameters, or only
+        their counts given with the "summary" query parameter,
+        the pages are cached until the user's todos change.
         Arguments:
             request: the request data sent by the user, it is used
                      to check the user's permissions and in Pagination
@@ -248,22 +317,202 @@ class TodoView(viewsets.ViewSet):
             HTTP 403 Response if the user is
             not authorized to see that user's todo items,
             HTTP 404 if user profile is not found,
+            HTTP 400 Response if the query parameters are not valid,
+            HTTP 304 Response if the todos didn't change since
+            the request's If-None-Match ETag,
             HTTP 200 Response with all todo items in
             the user's profile in JSON.
         """
 
-        user = get_object_or_404(UserProfileModel, account__username=username)
+        user = get_object_or_404(UserProfileModel.objects.select_related('account'),
+                                 account__username=username)
         self.check_object_permissions(request, user)
-        queryset = user.todo_groups.all()
 
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 10
-        paginator.max_limit = 100
-        paginated_queryset = paginator.paginate_queryset(queryset, request)
-        serializer = TodoGroupSerializer(paginated_queryset, many=True)
+        query = TodoListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = user_etag(user.pk, request)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+
+        cache_key = todo_tree_cache_key(user.pk, request.build_absolute_uri())
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.list_page(request, user, query.validated_data)
+            cache.set(cache_key, data, settings.TODO_TREE_CACHE_TIMEOUT)
+
+        return Response(data=data, headers={'ETag': etag})
+
+    def search(self, request, username=None):
+        """Searches the todo items of the user by their titles and descriptions.
+        The todos are found by full-text search and ranked by how well they match,
+        if none is found the todos with titles looking like the searched
+        text are given instead, the results are paginated by limit and offset.
+        Arguments:
+            request: the request data sent by the user, it is used
+                     to check the user's permissions, get the searched text
+                     from the "q" query parameter and in Pagination
+            username: the username of the user profile
+                      whose todo items will be searched
+        Returns:
+            HTTP 403 Response if the user is
+            not authorized to see that user's todo items,
+            HTTP 404 if user profile is not found,
+            HTTP 400 Response if no text is searched for,
+            HTTP 200 Response with the found todo items in JSON.
+        """
 
-        return Response(data={'limit': paginator.limit, 'offset': paginator.offset,
-                              'count': paginator.count, 'todo_groups': serializer.data})
+        user = get_object_or_404(UserProfileModel.objects.select_related('account'),
+                                 account__username=username)
+        self.check_object_permissions(request, user)
+
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'q': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = TodoSearchPagination()
+        page = paginator.paginate_queryset(search_todos(user.pk, text), request, view=self)
+        if paginator.count == 0:
+            page = paginator.paginate_queryset(fuzzy_search_todos(user.pk, text), request, view=self)
+
+        # the found todos and their groups are numbered at once instead of counted one by one
+        if gap_sorts() and page:
+            load_positions(page, TodoModel.objects.filter(category_id__in={todo.category_id for todo in page}),
+                           'category_id')
+            load_positions([todo.category for todo in page], user.todo_groups.all(), 'user_id')
+        serializer = TodoSearchSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def group_list(self, request, username=None, group_sort=None):
+        """Lists the todo items of one of the user's todo groups.
+        The todo items are paginated by limit and offset, or by a cursor
+        when the request's pagination query parameter is "cursor",
+        they can be filtered by their "status" and their "fields" picked
+        with query parameters, the pages are cached until the user's todos change.
+        Arguments:
+            request: the request data sent by the user, it is used
+                     to check the user's permissions and in Pagination
+            username: the username of the user profile
+                      whose todo items will be returned
+            group_sort: the sort of the todo group whose todo items will be returned
+        Returns:
+            HTTP 403 Response if the user is
+            not authorized to see that user's todo items,
+            HTTP 404 if the todo group or the user profile is not found,
+            HTTP 400 Response if the query parameters are not valid,
+            HTTP 304 Response if the todos didn't change since
+            the request's If-None-Match ETag,
+            HTTP 200 Response with the group's todo items in JSON.
+        """
+
+        todo_group = get_object_or_404(user_todo_group(username, group_sort).select_related('user__account'))
+        self.check_object_permissions(request, todo_group)
+
+        query = TodoQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = user_etag(todo_group.user_id, request)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+
+        cache_key = todo_tree_cache_key(todo_group.user_id, request.build_absolute_uri())
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.group_list_page(request, todo_group, query.validated_data)
+            cache.set(cache_key, data, settings.TODO_TREE_CACHE_TIMEOUT)
+
+        return Response(data=data, headers={'ETag': etag})
+
+    def todos_queryset(self, query):
+        """Gives the queryset of the todo items matching the query parameters,
+        the filters and the picked fields are applied in the queries
+        so the todos and attachments that aren't shown aren't loaded"""
+
+        todos = TodoModel.objects.all()
+        if 'status' in query:
+            todos = todos.filter(status=query['status'])
+        fields = query.get('fields')
+        if fields is None or 'attachments' in fields:
+            todos = todos.prefetch_related('attachments')
+        if fields is not None:
+            todos = todos.only('sort', 'category', *(fields & {'title', 'status', 'description'}))
+        return todos
+
+    def paginate(self, request, queryset, paginator_class, cursor_paginator_class):
+        """Gives the paginator and the requested page of a queryset,
+        the cursor paginator is used when the request's pagination query parameter is "cursor"."""
+
+        if request.query_params.get('pagination') == 'cursor':
+            paginator = cursor_paginator_class()
+        else:
+            paginator = paginator_class()
+        return paginator, paginator.paginate_queryset(queryset, request, view=self)
+
+    def page_data(self, paginator, name, data):
+        """Gives the data of a page with the pagination's details"""
+
+        if isinstance(paginator, CursorPagination):
+            return {'next': paginator.get_next_link(), 'previous': paginator.get_previous_link(), name: data}
+        return {'limit': paginator.limit, 'offset': paginator.offset, 'count': paginator.count, name: data}
+
+    def list_page(self, request, user, query):
+        """Gives the data of the requested page of the user's todo groups.
+        Arguments:
+            request: the request sent by the user, it is used in Pagination
+            user: the user profile whose todo groups are listed
+            query: the validated query parameters filtering the todos
+        Returns:
+            The page's todo groups with their todo items or their counts
+            in JSON and the pagination's details.
+        """
+
+        groups = user.todo_groups.all()
+        if 'group' in query:
+            groups = at_position(groups, query['group'])
+
+        if query['summary']:
+            status_filter = Q(todos__status=query['status']) if 'status' in query else None
+            groups = groups.annotate(todos_count=Count('todos', filter=status_filter),
+                                     checked_count=Count('todos', filter=Q(todos__status='C')))
+            paginator, page = self.paginate(request, groups, TodoGroupPagination, TodoGroupCursorPagination)
+            return self.page_data(paginator, 'todo_groups', TodoGroupSummarySerializer(page, many=True).data)
+
+        # the prefetches run once per page on the sliced groups,
+        # so the number of queries doesn't depend on the amount of data
+        queryset = groups.prefetch_related(Prefetch('todos', queryset=self.todos_queryset(query)))
+        paginator, page = self.paginate(request, queryset, TodoGroupPagination, TodoGroupCursorPagination)
+
+        if gap_sorts() and 'status' in query:
+            load_positions([todo for group in page for todo in group.todos.all()],
+                           TodoModel.objects.filter(category__in=page), 'category_id')
+        serializer = TodoGroupSerializer(page, many=True, context={'todo_fields': query.get('fields')})
+        return self.page_data(paginator, 'todo_groups', serializer.data)
+
+    def group_list_page(self, request, todo_group, query):
+        """Gives the data of the requested page of a todo group's items.
+        Arguments:
+            request: the request sent by the user, it is used in Pagination
+            todo_group: the todo group whose todo items are listed
+            query: the validated query parameters filtering the todos
+        Returns:
+            The page's todo items in JSON and the pagination's details.
+        """
+
+        queryset = self.todos_queryset(query).filter(category=todo_group)
+        paginator, page = self.paginate(request, queryset, TodoItemPagination, TodoItemCursorPagination)
+        for todo in page:
+            todo.category = todo_group
+
+        if gap_sorts() and 'status' in query:
+            load_positions(page, todo_group.todos.all(), 'category_id')
+        serializer = self.serializer_class(page, many=True, context={'todo_fields': query.get('fields')})
+        return self.page_data(paginator, 'todos', serializer.data)
 
     def retrieve(self, request, username=None, group_sort=None, pk=None):
         """Retrieves a certain todo item from the user's list
@@ -280,17 +529,26 @@ class TodoView(viewsets.ViewSet):
         Returns:
             HTTP 403 Response if the user is
             not authorized to see that user's todo item,
-            HTTP 404 Response if todo item or user are not found, if not,
+            HTTP 404 Response if todo item or user are not found,
+            HTTP 304 Response if the todo item didn't change since
+            the request's If-None-Match ETag, if not,
             returns HTTP 200 Response with the todo item's JSON data.
         """
-        todo_item = get_object_or_404(TodoModel, sort=pk, category__sort=group_sort,
-                                      category__user__account__username=username)
+        todo_item = get_object_or_404(user_todo_item(username, group_sort, pk,
+                                                     TodoModel.objects.select_related('category__user__account')))
         self.check_object_permissions(request, todo_item)
+        etag = user_etag(todo_item.category.user_id, request)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
         serializer = self.serializer_class(todo_item)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag})
 
     def create(self, request, group_sort=None, username=None):
         """Creates a new todo item and adds it to the user's list.
+        If the request's data is a list, all its todo items are
+        created at once or none of them is if any is not valid.
 
         Arguments:
             request: the request data sent by the user, it is used
@@ -303,13 +561,13 @@ class TodoView(viewsets.ViewSet):
             HTTP 403 Response if the user is
             not authorized to add a todo item to that user,
             HTTP 404 if user profile is not found,
-            HTTP 400 Response if the data is not valid, if not,
-            returns HTTP 201 Response with the todo item's JSON data.
+            HTTP 400 Response if the data is not valid with the errors
+            of each todo item when many are sent, if not,
+            returns HTTP 201 Response with the todo items' JSON data.
         """
-        todo_group = get_object_or_404(TodoGroupModel, user__account__username=username,
-                                       sort=group_sort)
+        todo_group = get_object_or_404(user_todo_group(username, group_sort).select_related('user__account'))
         self.check_object_permissions(request, todo_group)
-        serializer = self.serializer_class(data=request.data)
+        serializer = self.serializer_class(data=request.data, many=isinstance(request.data, list))
         if serializer.is_valid():
             serializer.save(category=todo_group)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -331,16 +589,21 @@ class TodoView(viewsets.ViewSet):
             HTTP 403 Response if the user is
             not authorized to update that todo item,
             HTTP 400 Response if the data is not valid with the errors,
-            HTTP 404 Response if the todo item is not found
+            HTTP 404 Response if the todo item is not found,
+            HTTP 412 Response if the todo item changed since
+            the request's If-Match ETag,
             if not returns HTTP 200 Response with the update JSON data.
         """
-        todo_item = get_object_or_404(TodoModel, sort=pk, category__sort=group_sort,
-                                      category__user__account__username=username)
+        todo_item = get_object_or_404(user_todo_item(username, group_sort, pk,
+                                                     TodoModel.objects.select_related('category__user__account')))
         self.check_object_permissions(request, todo_item)
+        response = get_conditional_response(request, etag=user_etag(todo_item.category.user_id, request))
+        if response is not None:
+            return response
         serializer = self.serializer_class(todo_item, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(serializer.data, headers={'ETag': user_etag(todo_item.category.user_id, request)})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def partial_update(self, request, username=None, group_sort=None, pk=None):
@@ -359,16 +622,21 @@ class TodoView(viewsets.ViewSet):
             HTTP 403 Response if the user is
             not authorized to update that todo item,
             HTTP 400 Response if the data is not valid with the errors,
-            HTTP 404 Response if the todo item is not found
+            HTTP 404 Response if the todo item is not found,
+            HTTP 412 Response if the todo item changed since
+            the request's If-Match ETag,
             if not returns HTTP 200 Response with the update JSON data.
         """
-        todo_item = get_object_or_404(TodoModel, sort=pk, category__sort=group_sort,
-                                      category__user__account__username=username)
+        todo_item = get_object_or_404(user_todo_item(username, group_sort, pk,
+                                                     TodoModel.objects.select_related('category__user__account')))
         self.check_object_permissions(request, todo_item)
+        response = get_conditional_response(request, etag=user_etag(todo_item.category.user_id, request))
+        if response is not None:
+            return response
         serializer = self.serializer_class(todo_item, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(serializer.data, headers={'ETag': user_etag(todo_item.category.user_id, request)})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, username=None, group_sort=None, pk=None):
@@ -388,8 +656,8 @@ class TodoView(viewsets.ViewSet):
             not authorized to delete that todo item,
             if not, returns HTTP 204 Response with no content.
         """
-        todo_item = get_object_or_404(TodoModel, sort=pk, category__sort=group_sort,
-                                      category__user__account__username=username)
+        todo_item = get_object_or_404(user_todo_item(username, group_sort, pk,
+                                                     TodoModel.objects.select_related('category')))
         self.check_object_permissions(request, todo_item)
         todo_item.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -397,12 +665,27 @@ class TodoView(viewsets.ViewSet):
 
 class TodoAttachmentView(viewsets.ViewSet):
     """View for the todo attachment.
-    Creates and Deletes a todo attachment.
+    Creates, Downloads and Deletes a todo attachment.
     """
 
     permission_classes = (TodoAttachmentPermissions,)
     serializer_class = TodoAttachmentSerializer
 
+    def initialize_request(self, request, *args, **kwargs):
+        """Streams the uploaded attachments to the disk with the AttachmentUploadHandler,
+        it's set before the request is initialized as the session authentication
+        can read the request's body while checking the CSRF token"""
+
+        self.upload_handler = AttachmentUploadHandler(request)
+        request.upload_handlers = [self.upload_handler]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Deletes the partial file of an upload that was interrupted"""
+
+        self.upload_handler.cleanup()
+        return super().finalize_response(request, response, *args, **kwargs)
+
     def create(self, request, username=None, group_sort=None, item_sort=None):
         """Creates a new todo attachment and adds it to the item's list.
         Arguments:
@@ -419,15 +702,44 @@ class TodoAttachmentView(viewsets.ViewSet):
             HTTP 400 Response if the data is not valid, if not,
             returns HTTP 201 Response with the todo attachment's JSON data.
         """
-        todo_item = get_object_or_404(TodoModel, category__user__account__username=username,
-                                      category__sort=group_sort, sort=item_sort)
+        todo_item = get_object_or_404(user_todo_item(username, group_sort, item_sort,
+                                                     TodoModel.objects.select_related('category__user__account')))
         self.check_object_permissions(request, todo_item)
         serializer = self.serializer_class(data=request.data)
+        if self.upload_handler.too_large:
+            return Response({'file': [ATTACHMENT_TOO_LARGE]}, status=status.HTTP_400_BAD_REQUEST)
         if serializer.is_valid():
             serializer.save(todo_item=todo_item)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def download(self, request, username=None, group_sort=None, item_sort=None, pk=None):
+        """Sends the file of a certain todo attachment.
+        Arguments:
+            request: the request data sent by the user, it is used
+                     to check the user's permissions and the conditional
+                     and range headers
+            username: the username of the user profile
+                      whose todo attachment will be downloaded
+            group_sort: the todo group sort that the todo is in
+            item_sort: the todo item sort that the attachment is in
+            pk: the sort of the todo attachment that the user wants to download,
+                it should by an integer.
+        Returns:
+            HTTP 404 Response if the todo attachment or its file is not found
+            HTTP 403 Response if the user is
+            not authorized to download that todo attachment,
+            HTTP 304 or 412 Response for the conditional requests,
+            HTTP 206 Response with a part of the file for range requests,
+            if not, returns HTTP 200 Response with the file.
+        """
+        attachment = get_object_or_404(at_position(
+            TodoAttachmentModel.objects.select_related('todo_item__category', 'blob').filter(
+                todo_item__in=user_todo_item(username, group_sort, item_sort)), pk))
+        self.check_object_permissions(request, attachment)
+        return attachment_response(request, attachment)
+
     def destroy(self, request, username=None, group_sort=None, item_sort=None, pk=None):
         """Deletes a certain todo attachment from the todo's attachments.
         Arguments:
@@ -446,8 +758,108 @@ class TodoAttachmentView(viewsets.ViewSet):
             not authorized to delete that todo attachment,
             if not, returns HTTP 204 Response with no content.
         """
-        attachment = get_object_or_404(TodoAttachmentModel, todo_item__category__user__account__username=username,
-                                       todo_item__category__sort=group_sort, todo_item__sort=item_sort, sort=pk)
+        attachment = get_object_or_404(at_position(
+            TodoAttachmentModel.objects.select_related('todo_item__category').filter(
+                todo_item__in=user_todo_item(username, group_sort, item_sort)), pk))
         self.check_object_permissions(request, attachment)
         attachment.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchView(viewsets.ViewSet):
+    """View for batches of todo group and todo item operations.
+    Runs many creates, updates, reorders and deletes in one request.
+    """
+
+    permission_classes = (BatchPermissions,)
+    serializer_class = BatchSerializer
+    resource_serializers = {
+        'todo-group': TodoGroupSerializer,
+        'todo-item': TodoItemSerializer,
+    }
+
+    def create(self, request, username=None):
+        """Runs a batch of operations on the user's todo groups and items.
+        The operations run in order in one transaction, each one works
+        like the request it replaces on TodoGroupView or TodoView and sees
+        the changes of the ones before it, the first failing operation stops
+        the batch and rolls back all the operations that were done before it.
+        Arguments:
+            request: the request data sent by the user, it is used
+                     to check the user's permissions and get the operations.
+            username: the username of the user profile
+                      whose todo groups and items will be changed
+        Returns:
+            HTTP 403 Response if the user is
+            not authorized to change that user's todo groups and items,
+            HTTP 404 if user profile is not found,
+            HTTP 400 Response if the batch is not valid, or with the results
+            of the operations up to the failed one if an operation fails,
+            if not, returns HTTP 200 Response with the results of all the operations.
+        """
+        user = get_object_or_404(UserProfileModel.objects.select_related('account'),
+                                 account__username=username)
+        self.check_object_permissions(request, user)
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        with transaction.atomic():
+            for operation in serializer.validated_data['operations']:
+                result = self.run_operation(user, operation)
+                results.append(result)
+                if result['status'] >= status.HTTP_400_BAD_REQUEST:
+                    transaction.set_rollback(True)
+                    return Response(data={'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(data={'results': results})
+
+    def run_operation(self, user, operation):
+        """Runs a single operation of a batch.
+        Arguments:
+            user: the user profile whose todo groups and items are changed,
+                  the objects are only looked up between its own.
+            operation: the validated data of the operation.
+        Returns:
+            A dict with the HTTP status of the operation and
+            its JSON data or errors.
+        """
+        serializer_class = self.resource_serializers[operation['resource']]
+        action = operation['action']
+
+        if operation['resource'] == 'todo-group':
+            if action == 'create':
+                parent = {'user': user}
+            else:
+                instance = at_position(user.todo_groups.all(), operation['sort']).first()
+        else:
+            if action == 'create':
+                todo_group = at_position(user.todo_groups.all(), operation['group_sort']).first()
+                if todo_group is None:
+                    return {'status': status.HTTP_404_NOT_FOUND, 'errors': {'detail': 'Not found.'}}
+                parent = {'category': todo_group}
+            else:
+                todos = TodoModel.objects.select_related('category__user__account').filter(
+                    category__in=at_position(TodoGroupModel.objects.filter(user=user), operation['group_sort']))
+                instance = at_position(todos, operation['sort']).first()
+
+        if action == 'create':
+            serializer = serializer_class(data=operation['data'])
+            if serializer.is_valid():
+                serializer.save(**parent)
+                return {'status': status.HTTP_201_CREATED, 'data': serializer.data}
+            return {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
+
+        if instance is None:
+            return {'status': status.HTTP_404_NOT_FOUND, 'errors': {'detail': 'Not found.'}}
+
+        if action == 'destroy':
+            instance.delete()
+            return {'status': status.HTTP_204_NO_CONTENT}
+
+        serializer = serializer_class(instance, data=operation['data'], partial=action == 'partial_update')
+        if serializer.is_valid():
+            serializer.save()
+            return {'status': status.HTTP_200_OK, 'data': serializer.data}
+        return {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
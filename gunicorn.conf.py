@@ -0,0 +1,56 @@
+"""
+The gunicorn configuration of the production WSGI server:
+
+    gunicorn -c gunicorn.conf.py Todo.wsgi:application
+
+It's tuned with the PORT, GUNICORN_WORKERS, GUNICORN_THREADS and
+GUNICORN_PRELOAD environment variables and uses Todo.settings_production.
+"""
+
+import multiprocessing
+import os
+import shutil
+
+bind = '0.0.0.0:{0}'.format(os.environ.get('PORT', '8000'))
+
+# the views wait on the database, so there are more workers than CPUs to keep them busy,
+# more than one thread makes the workers gthread ones that share their memory between threads
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# the app is imported once by the master and the workers are forked from it,
+# so they start faster and share its memory until they change it
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# the workers are replaced after a number of requests so a leak can't grow forever,
+# with a jitter so they aren't all replaced at once
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 30
+graceful_timeout = 30
+keepalive = 2
+
+# the workers' heartbeat files are kept in memory, a docker container's /tmp is on disk
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+
+raw_env = ['DJANGO_SETTINGS_MODULE=Todo.settings_production']
+
+
+def on_starting(server):
+    """Empties the metrics directory, the files of the previous run's workers aren't exported"""
+
+    directory = os.environ.get('METRICS_DIR', '/tmp/todo-metrics')
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def when_ready(server):
+    """Closes the database connections the master opened while preloading the app,
+    before the workers are forked, so no worker shares its parent's connection"""
+
+    if preload_app:
+        from django.db import connections
+        connections.close_all()